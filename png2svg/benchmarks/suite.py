@@ -0,0 +1,290 @@
+# suite.py
+"""
+Throughput and quality benchmarks for the png2svg engines.
+
+    python -m benchmarks --out bench.json
+    python -m benchmarks --quick --baseline bench.json     # exit code 1 on regression
+
+Every metric is stored as {"value", "unit", "better"} under a slash-separated
+key, e.g. "render/monalisa/n150/s4" or "quality/greedy/nuit/evals20000".
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from core.engine_ga import GAEngine
+from core.engine_greedy import GreedyEngine
+from core.fitness import LOSSES, FitnessKernel, l1_loss
+from core.genotype import Genotype
+from core.incremental import IncrementalCanvas
+from core.mutation import mutate_one_shape_inplace, random_shape
+from core.phenotype import Phenotype
+from core.render_cache import RenderCache
+from io_utils.image import load_image_bgr
+from utils.rng import RandomStream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES = ("monalisa.jpg", "nuit.jpg", "the_sea_of_fog.jpg")
+SYNTHETIC = (256, 512, 1024)
+
+Results = Dict[str, Dict[str, object]]
+
+
+def _metric(results: Results, key: str, value: float, unit: str, better: str = "higher") -> None:
+    results[key] = {"value": round(float(value), 4), "unit": unit, "better": better}
+    print(f"  {key:48s} {value:12.2f} {unit}", flush=True)
+
+
+def _rate(fn: Callable[[], object], min_time: float, repeats: int) -> float:
+    """Median calls/s over `repeats` runs of at least `min_time` seconds each."""
+    fn()
+    rates = []
+    for _ in range(repeats):
+        n, t0 = 0, time.perf_counter()
+        while True:
+            fn()
+            n += 1
+            dt = time.perf_counter() - t0
+            if dt >= min_time:
+                break
+        rates.append(n / dt)
+    return float(np.median(rates))
+
+
+def _synthetic(size: int) -> np.ndarray:
+    """Deterministic smooth gradients + blobs + noise, size x size."""
+    rng = np.random.default_rng(size)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    img = np.stack([255 * x, 255 * y, 255 * (1 - x) * y], axis=2)
+    for _ in range(12):
+        cx, cy, r = rng.random(3)
+        blob = np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (0.02 + 0.05 * r))
+        img += blob[..., None] * rng.uniform(-120, 120, 3)
+    img += rng.normal(0, 8, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def load_targets(quick: bool) -> Dict[str, np.ndarray]:
+    names = IMAGES[:1] if quick else IMAGES
+    targets = {os.path.splitext(n)[0]: load_image_bgr(os.path.join(ROOT, "images", n)) for n in names}
+    for size in (SYNTHETIC[:2] if quick else SYNTHETIC):
+        targets[f"synth{size}"] = _synthetic(size)
+    return targets
+
+
+def _background(target: np.ndarray) -> Tuple[int, int, int]:
+    return tuple(int(c) for c in target.mean(axis=(0, 1)))
+
+
+def _genotype(target: np.ndarray, n: int, seed: int) -> Genotype:
+    rng = RandomStream(seed)
+    h, w = target.shape[:2]
+    return Genotype([random_shape(rng, w, h, target, "mixed", 6, int(min(w, h) * 0.35), 0.65) for _ in range(n)])
+
+
+def bench_render(targets: Dict[str, np.ndarray], results: Results, quick: bool, seed: int) -> None:
+    counts = (10, 150) if quick else (10, 50, 150, 400)
+    for name, target in targets.items():
+        h, w = target.shape[:2]
+        for scale in (1, 4):
+            phen = Phenotype(w, h, _background(target), scale=scale)
+            for n in counts:
+                g = _genotype(target, n, seed)
+                _metric(results, f"render/{name}/n{n}/s{scale}",
+                        _rate(lambda: phen.render(g), 0.2 if quick else 0.5, 3), "renders/s")
+
+
+def bench_l1(targets: Dict[str, np.ndarray], results: Results, quick: bool, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    for name, target in targets.items():
+        other = rng.integers(0, 256, target.shape, dtype=np.uint8)
+        calls = _rate(lambda: l1_loss(target, other), 0.2 if quick else 0.5, 3)
+        _metric(results, f"l1_loss/{name}", calls * target.shape[0] * target.shape[1] / 1e6, "Mpix/s")
+
+
+def bench_fitness(targets: Dict[str, np.ndarray], results: Results, quick: bool, seed: int) -> None:
+    """Full-canvas loss throughput of the FitnessKernel variants (compare with l1_loss/<name>)."""
+    rng = np.random.default_rng(seed)
+    for name, target in targets.items():
+        other = rng.integers(0, 256, target.shape, dtype=np.uint8)
+        mpix = target.shape[0] * target.shape[1] / 1e6
+        for kind in LOSSES:
+            kernel = FitnessKernel(target, kind)
+            calls = _rate(lambda: kernel.loss(other), 0.2 if quick else 0.5, 3)
+            _metric(results, f"fitness/{kind}/{name}", calls * mpix, "Mpix/s")
+
+
+def bench_engine_ops(targets: Dict[str, np.ndarray], results: Results, quick: bool, seed: int) -> None:
+    """Inner-loop rates of the engines at the default fitness scale: candidates, mutations, GA evaluations."""
+    scale = 4
+    for name, target in targets.items():
+        h, w = target.shape[:2]
+        phen = Phenotype(w, h, _background(target), scale=scale)
+        small = cv2.resize(target, (phen.width, phen.height), interpolation=cv2.INTER_AREA)
+        g = _genotype(target, 100, seed)
+
+        state = IncrementalCanvas(phen, small, g)
+        cands = _genotype(target, 45, seed + 1).shapes
+        rate = _rate(lambda: state.score_batch(cands), 0.3 if quick else 1.0, 3)
+        _metric(results, f"candidates/{name}", rate * len(cands), "candidates/s")
+
+        cache = RenderCache(phen, small, g)
+        rng = RandomStream(seed)
+
+        def mutate_and_reject() -> None:
+            idx = rng.randrange(len(g.shapes))
+            old = g.shapes[idx].copy()
+            mutate_one_shape_inplace(rng, g.shapes[idx], w, h, target, scale, 0.70)
+            cache.replace(g, idx, old)
+            g.shapes[idx] = old
+            cache.reject()
+
+        _metric(results, f"mutations/{name}", _rate(mutate_and_reject, 0.3 if quick else 1.0, 3), "mutations/s")
+
+        ga = GAEngine(target, "mixed", 100, time_limit=1e9, enable_viz=False, fitness_scale=scale, fitness_cache=0,
+                      seed=seed)
+        scored = ga.evaluate(ga.init_population())
+
+        def generation() -> None:
+            nonlocal scored
+            scored = ga.evaluate(ga.next_generation(scored))
+
+        # evaluations actually run: elites and memoised children are not re-rendered
+        rates = []
+        for _ in range(3):
+            evals, t0 = ga.evals, time.perf_counter()
+            while time.perf_counter() - t0 < (0.3 if quick else 1.0):
+                generation()
+            rates.append((ga.evals - evals) / (time.perf_counter() - t0))
+        _metric(results, f"ga_evals/{name}", float(np.median(rates)), "evals/s")
+
+
+def _run_engine(algo: str, target: np.ndarray, seed: int, n_shapes: int, time_limit: float,
+                max_evals: Optional[int]) -> float:
+    if algo == "ga":
+        eng = GAEngine(target, "mixed", n_shapes, time_limit, enable_viz=False, max_evals=max_evals, seed=seed)
+    else:
+        eng = GreedyEngine(target, "mixed", n_shapes, time_limit, enable_viz=False, max_evals=max_evals,
+                           refine_strategy="anneal" if algo == "anneal" else "hill", seed=seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        best = eng.run()
+    # compare engines on the same footing: L1 at scale 4 of the returned genotype
+    phen = Phenotype(eng.width, eng.height, eng.background_bgr, scale=4)
+    small = cv2.resize(target, (phen.width, phen.height), interpolation=cv2.INTER_AREA)
+    return l1_loss(small, phen.render(best))
+
+
+def bench_quality(targets: Dict[str, np.ndarray], results: Results, quick: bool, seed: int) -> None:
+    """L1 reached at fixed evaluation budgets (deterministic for a seed) and fixed wall-clock budgets."""
+    n_shapes = 60 if quick else 120
+    eval_budget = {"greedy": 8000 if quick else 30000, "ga": 1000 if quick else 4000}
+    eval_budget["anneal"] = eval_budget["greedy"]
+    time_budget = 4.0 if quick else 15.0
+    for name, target in targets.items():
+        if name.startswith("synth"):
+            continue
+        for algo in ("greedy", "anneal", "ga"):
+            budget = eval_budget[algo]
+            _metric(results, f"quality/{algo}/{name}/evals{budget}",
+                    _run_engine(algo, target, seed, n_shapes, 600.0, budget), "L1", better="lower")
+            _metric(results, f"quality/{algo}/{name}/time{time_budget:g}s",
+                    _run_engine(algo, target, seed, n_shapes, time_budget, None), "L1", better="lower")
+
+
+GROUPS = {
+    "render": bench_render,
+    "l1": bench_l1,
+    "fitness": bench_fitness,
+    "ops": bench_engine_ops,
+    "quality": bench_quality,
+}
+
+
+def _meta(quick: bool, seed: int) -> Dict[str, object]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        rev = None
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git": rev,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "quick": quick,
+        "seed": seed,
+    }
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> List[str]:
+    """Metrics present in both runs that got worse by more than `tolerance` (relative)."""
+    regressions = []
+    print(f"\n{'metric':50s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for key in sorted(set(results) & set(baseline)):
+        cur, base = float(results[key]["value"]), float(baseline[key]["value"])
+        if base == 0:
+            continue
+        change = cur / base - 1.0
+        worse = -change if results[key]["better"] == "higher" else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{key:50s} {base:12.2f} {cur:12.2f} {change * 100:+7.1f}%{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser("benchmarks")
+    p.add_argument("--out", default="bench.json", help="Output JSON path.")
+    p.add_argument("--baseline", default=None, help="Saved results to compare against.")
+    p.add_argument("--tolerance", type=float, default=0.10,
+                   help="Relative slowdown / loss increase reported as a regression.")
+    p.add_argument("--only", default=",".join(GROUPS), help=f"Comma-separated groups among {','.join(GROUPS)}.")
+    p.add_argument("--quick", action="store_true", help="One image, fewer sizes, short budgets.")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in GROUPS]
+    if unknown:
+        p.error(f"unknown group(s): {', '.join(unknown)}")
+
+    targets = load_targets(args.quick)
+    results: Results = {}
+    for g in groups:
+        print(f"[{g}]", flush=True)
+        GROUPS[g](targets, results, args.quick, args.seed)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": _meta(args.quick, args.seed), "results": results}, f, indent=2)
+    print(f"\nResults saved to: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance * 100:.0f}%.")
+            return 1
+        print("\nNo regression.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# anneal.py
+from __future__ import annotations
+
+import math
+from typing import List, Optional
+
+from core.color_fit import ColorFitter
+from core.shapes import Circle, Ellipse, Rectangle, Shape, clamp_int
+from core.mutation import _sample_color
+from core.target_index import TargetIndex
+from utils.rng import RandomStream
+
+OPERATORS = ("move", "resize", "rotate", "recolor", "alpha")
+REFINE_STRATEGIES = ("hill", "anneal")
+
+# initial step (sigma of the gaussian nudge) and [lo, hi] bounds per operator;
+# "move" is in fitness pixels and scaled to full-res, the rest in their own units
+STEP0 = {"move": 1.5, "resize": 8.0, "rotate": 8.0, "recolor": 8.0, "alpha": 0.03}
+_STEP_BOUNDS = {"move": (0.5, 64.0), "resize": (1.0, 256.0), "rotate": (0.25, 90.0),
+                "recolor": (1.0, 64.0), "alpha": (0.005, 0.25)}
+
+
+def clamp_step(op: str, step: float) -> float:
+    lo, hi = _STEP_BOUNDS[op]
+    return lo if step < lo else hi if step > hi else step
+
+
+def _nudge(rng: RandomStream, sigma: float) -> int:
+    """Integer gaussian step, never 0 (a no-op proposal wastes an evaluation)."""
+    d = int(round(rng.gauss(0.0, sigma)))
+    return d if d else rng.choice((-1, 1))
+
+
+def operators_for(s: Shape) -> tuple:
+    """Operators that change s: circles have no rotation."""
+    return OPERATORS if not isinstance(s, Circle) else ("move", "resize", "recolor", "alpha")
+
+
+def apply_operator(
+        rng: RandomStream,
+        s: Shape,
+        op: str,
+        step: float,
+        width: int,
+        height: int,
+        target_bgr,
+        small_scale: int,
+        alpha_floor: float,
+        fitter: Optional[ColorFitter] = None,
+        index: Optional[TargetIndex] = None,
+) -> None:
+    """Perturb one group of parameters of s in place; with a fitter the colour is re-fitted after any change."""
+    if op == "move":
+        sigma = step * small_scale
+        s.cx = clamp_int(int(s.cx + _nudge(rng, sigma)), 0, width - 1)
+        s.cy = clamp_int(int(s.cy + _nudge(rng, sigma)), 0, height - 1)
+    elif op == "resize":
+        if isinstance(s, Rectangle):
+            s.w = clamp_int(int(s.w + _nudge(rng, step)), 4, max(8, width))
+            s.h = clamp_int(int(s.h + _nudge(rng, step)), 4, max(8, height))
+        elif isinstance(s, Circle):
+            s.radius = clamp_int(int(s.radius + _nudge(rng, step)), 3, max(6, min(width, height)))
+        elif isinstance(s, Ellipse):
+            s.rx = clamp_int(int(s.rx + _nudge(rng, step)), 3, max(6, width))
+            s.ry = clamp_int(int(s.ry + _nudge(rng, step)), 3, max(6, height))
+    elif op == "rotate":
+        s.angle_deg = (float(s.angle_deg) + rng.gauss(0.0, step)) % 360.0
+    elif op == "alpha":
+        s.alpha = max(alpha_floor, min(0.98, float(s.alpha + rng.gauss(0.0, step))))
+    elif op == "recolor" and fitter is None:
+        if rng.random() < 0.45:
+            s.color_rgb = _sample_color(target_bgr, index, int(s.cx), int(s.cy), small_scale)
+        else:
+            s.color_rgb = tuple(clamp_int(int(c + _nudge(rng, step)), 0, 255) for c in s.color_rgb)
+    elif op != "recolor":
+        raise ValueError(f"Unknown mutation operator: {op}")
+
+    if fitter is not None:
+        # "recolor" is then a plain re-fit against the (since changed) canvas underneath
+        fitter.fit(s, alpha_floor, 0.98)
+
+
+class Annealer:
+    """
+    Refine strategy for the greedy engine's mutate/score loop:
+
+    - Metropolis acceptance at a temperature decaying geometrically from T0
+      to ~0 over the remaining refine budget; T0 is calibrated from the
+      uphill deltas of the first `warmup` proposals (run at T = 0) so that a
+      median uphill move starts out accepted with probability `p0`.
+    - One step size per operator, multiplied by exp(adapt * (success - target))
+      after each of its proposals: steps grow while more than `target` of
+      them improve the loss and shrink otherwise.
+    - Operator choice by adaptive probability matching: each operator keeps
+      an average of the loss improvement it delivers per proposal and is
+      drawn with probability proportional to it, never below `p_min`.
+
+    The engine keeps the best genotype separately, since accepted uphill
+    moves make the current one worse.
+    """
+
+    def __init__(self, rng: RandomStream, warmup: int = 64, p0: float = 0.02, end_ratio: float = 1e-3,
+                 target: float = 0.1, adapt: float = 0.1, p_min: float = 0.05, rate: float = 0.05):
+        self.rng = rng
+        self.warmup = int(warmup)
+        self.p0 = float(p0)
+        self.end_ratio = float(end_ratio)
+        self.target = float(target)
+        self.adapt = float(adapt)
+        self.p_min = float(p_min)
+        self.rate = float(rate)
+
+        self.steps = dict(STEP0)
+        self.quality = {op: 0.0 for op in OPERATORS}
+        self.tried = {op: 0 for op in OPERATORS}
+        self.improved = {op: 0 for op in OPERATORS}
+        self.t0: Optional[float] = None
+        self.temperature = 0.0
+        self._uphill: List[float] = []
+        self._proposals = 0
+
+    def choose(self, s: Shape) -> str:
+        ops = operators_for(s)
+        total = sum(self.quality[op] for op in ops)
+        if total <= 0.0:
+            return self.rng.choice(ops)
+        p_min = min(self.p_min, 1.0 / len(ops))
+        r = self.rng.random()
+        for op in ops:
+            r -= p_min + (1.0 - len(ops) * p_min) * self.quality[op] / total
+            if r < 0.0:
+                return op
+        return ops[-1]
+
+    def accept(self, delta: float, progress: float) -> bool:
+        """Metropolis test for a loss change of delta at refine progress in [0, 1]."""
+        if delta <= 0.0:
+            return True
+        if self.t0 is None:
+            self._uphill.append(delta)
+            if len(self._uphill) >= self.warmup:
+                self._uphill.sort()
+                self.t0 = self._uphill[len(self._uphill) // 2] / math.log(1.0 / self.p0)
+            return False
+        self.temperature = self.t0 * self.end_ratio ** min(1.0, max(0.0, progress))
+        return self.rng.random() < math.exp(-delta / max(1e-12, self.temperature))
+
+    def feedback(self, op: str, delta: float) -> None:
+        self._proposals += 1
+        self.tried[op] += 1
+        success = delta < 0.0
+        self.improved[op] += success
+        self.quality[op] += self.rate * (max(0.0, -delta) - self.quality[op])
+        self.steps[op] = clamp_step(op, self.steps[op] * math.exp(self.adapt * (success - self.target)))
+
+    def summary(self) -> str:
+        total = max(1, self._proposals)
+        parts = [f"{op} {100.0 * self.tried[op] / total:.0f}%/{self.steps[op]:.3g}" for op in OPERATORS]
+        t0 = f"{self.t0:.4g}" if self.t0 is not None else "-"
+        return f"anneal T0={t0} " + " ".join(parts)
@@ -0,0 +1,54 @@
+# codec.py
+from __future__ import annotations
+
+from typing import List, Sequence
+import numpy as np
+
+from core.shapes import Rectangle, Circle, Ellipse, Shape
+
+KIND_RECT, KIND_CIRCLE, KIND_ELLIPSE = 0, 1, 2
+
+# one packed record (40 bytes) per shape; rectangle: a=w, b=h / circle: a=radius / ellipse: a=rx, b=ry
+SHAPE_DTYPE = np.dtype([
+    ("kind", "u1"),
+    ("cx", "<i4"),
+    ("cy", "<i4"),
+    ("a", "<i4"),
+    ("b", "<i4"),
+    ("angle", "<f8"),
+    ("rgb", "u1", (3,)),
+    ("alpha", "<f8"),
+    ("age", "<i4"),
+])
+
+
+def encode_shape(s: Shape) -> tuple:
+    if isinstance(s, Rectangle):
+        head = (KIND_RECT, s.cx, s.cy, s.w, s.h, s.angle_deg)
+    elif isinstance(s, Circle):
+        head = (KIND_CIRCLE, s.cx, s.cy, s.radius, 0, 0.0)
+    elif isinstance(s, Ellipse):
+        head = (KIND_ELLIPSE, s.cx, s.cy, s.rx, s.ry, s.angle_deg)
+    else:
+        raise TypeError(f"Cannot encode shape: {type(s).__name__}")
+    return head + (tuple(s.color_rgb), s.alpha, s.age)
+
+
+def decode_shape(rec) -> Shape:
+    kind, cx, cy, a, b, angle, rgb, alpha, age = rec
+    color = (int(rgb[0]), int(rgb[1]), int(rgb[2]))
+    if kind == KIND_RECT:
+        return Rectangle(int(cx), int(cy), int(a), int(b), color, float(alpha), float(angle), _age=int(age))
+    if kind == KIND_CIRCLE:
+        return Circle(int(cx), int(cy), int(a), color, float(alpha), _age=int(age))
+    if kind == KIND_ELLIPSE:
+        return Ellipse(int(cx), int(cy), int(a), int(b), color, float(alpha), float(angle), _age=int(age))
+    raise ValueError(f"Unknown shape kind: {kind}")
+
+
+def encode_shapes(shapes: Sequence[Shape]) -> np.ndarray:
+    return np.array([encode_shape(s) for s in shapes], dtype=SHAPE_DTYPE)
+
+
+def decode_shapes(arr: np.ndarray) -> List[Shape]:
+    return [decode_shape(rec) for rec in np.asarray(arr, dtype=SHAPE_DTYPE).tolist()]
@@ -0,0 +1,71 @@
+# color_fit.py
+from __future__ import annotations
+
+from typing import Callable, Optional
+import cv2
+import numpy as np
+
+from core.phenotype import Phenotype, ROI
+from core.shapes import Shape, clamp_int
+
+COLOR_FIT_MODES = ("sample", "l2", "l1", "joint")
+
+
+class ColorFitter:
+    """
+    Closed-form colour (and optionally alpha) of a shape given the canvas
+    underneath it. With out = (1 - a) * under + a * c over the shape's mask:
+      l2    c = (mean(T) - (1 - a) * mean(under)) / a          (alpha kept)
+      l1    c = median((T - (1 - a) * under) / a)              (alpha kept)
+      joint 1 - a = least-squares slope of T on under, then l2 colour
+    """
+
+    def __init__(self, phen: Phenotype, target_small: np.ndarray, mode: str = "l2"):
+        if mode not in COLOR_FIT_MODES or mode == "sample":
+            raise ValueError(f"Unknown colour fit mode: {mode}")
+        self.phen = phen
+        self.target = target_small
+        self.mode = mode
+        self.canvas: Optional[np.ndarray] = None
+        self.under: Optional[Callable[[ROI], np.ndarray]] = None
+
+    def _under(self, roi: ROI) -> np.ndarray:
+        if self.under is not None:
+            return self.under(roi)
+        assert self.canvas is not None
+        x0, y0, x1, y1 = roi
+        return self.canvas[y0:y1, x0:x1]
+
+    def fit(self, s: Shape, alpha_floor: float, alpha_max: float = 0.98) -> None:
+        roi = self.phen.roi(s)
+        if roi is None:
+            return
+        x0, y0, x1, y1 = roi
+        mask = self.phen.mask(s, roi)
+        if not mask.any():
+            return
+
+        target = self.target[y0:y1, x0:x1]
+        under = self._under(roi)
+        mt = np.array(cv2.mean(target, mask)[:3])
+        mu = np.array(cv2.mean(under, mask)[:3])
+        a = float(s.alpha)
+
+        if self.mode == "joint":
+            m = mask > 0
+            t = target[m].astype(np.float64) - mt
+            u = under[m].astype(np.float64) - mu
+            var = float((u * u).sum())
+            a = alpha_max if var < 1e-6 else 1.0 - float((t * u).sum()) / var
+            a = max(alpha_floor, min(alpha_max, a))
+            s.alpha = a
+
+        if self.mode == "l1":
+            m = mask > 0
+            v = (target[m].astype(np.float32) - (1.0 - a) * under[m].astype(np.float32)) / a
+            bgr = np.median(v, axis=0)
+        else:
+            bgr = (mt - (1.0 - a) * mu) / a
+
+        b, g, r = (clamp_int(int(round(float(c))), 0, 255) for c in bgr)
+        s.color_rgb = (r, g, b)
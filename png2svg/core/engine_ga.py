@@ -2,14 +2,20 @@
 from __future__ import annotations
 
 import time
-import random
-import cv2
+from typing import List, Tuple
 import numpy as np
 
 from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
 from core.phenotype import Phenotype
-from core.fitness import l1_loss
+from core.fitness import FitnessCache, FitnessKernel
+from core.incremental import IncrementalCanvas
 from core.mutation import random_shape, mutate_one_shape_inplace
+from core.target_index import TargetPyramid
+from io_utils.serialization import Checkpoint, CheckpointWriter
+from utils.profiler import Profiler
+from utils.rng import RandomStream, Seed
+from utils.telemetry import Telemetry
 from utils.visualizer import Visualizer
 
 
@@ -21,102 +27,214 @@ class GAEngine:
             n_shapes: int,
             time_limit: float,
             enable_viz: bool = True,
+            viz_size: int = 0,
             fitness_scale: int = 4,
             population_size: int = 20,
             mutation_rate: float = 0.25,
+            init_candidates: int = 1,
+            fitness_cache: int = 256,
+            renderer: str = "opencv",
+            antialias: bool = False,
+            telemetry: Telemetry | None = None,
+            max_evals: int | None = None,
+            profile: bool = False,
+            resume: Checkpoint | None = None,
+            checkpoint: str | None = None,
+            checkpoint_every: float = 30.0,
+            loss: str = "l1",
+            seed: Seed = None,
     ):
         self.target = target_bgr
         self.height, self.width = target_bgr.shape[:2]
         self.shape_mode = shape_mode
         self.n_shapes = int(n_shapes)
+        if self.n_shapes < 1:
+            raise ValueError(f"The GA needs at least one shape per genotype (n_shapes={self.n_shapes}).")
         self.time_limit = float(time_limit)
         self.enable_viz = enable_viz
+        self.viz_size = max(0, int(viz_size))
+        self.renderer = renderer
+        self.antialias = bool(antialias)
 
         mean = self.target.mean(axis=(0, 1))
         self.background_bgr = tuple(int(c) for c in mean)
 
+        self.rng = RandomStream(seed)
         self.scale = max(2, int(fitness_scale))
         self.pop_size = max(6, int(population_size))
         self.mutation_rate = float(max(0.0, min(1.0, mutation_rate)))
-
-        self.phen_small = Phenotype(self.width, self.height, self.background_bgr, scale=self.scale)
-        self.target_small = cv2.resize(
-            self.target,
-            (self.phen_small.width, self.phen_small.height),
-            interpolation=cv2.INTER_AREA,
-        )
-        self.phen_full = Phenotype(self.width, self.height, self.background_bgr, scale=1)
+        self.init_candidates = max(1, int(init_candidates))
+
+        self.phen_small = Phenotype(self.width, self.height, self.background_bgr, scale=self.scale,
+                                    renderer=self.renderer, antialias=self.antialias)
+        self.pyramid = TargetPyramid(self.target, scales=(1, self.scale))
+        self.index = self.pyramid.at(1)
+        self.target_small = self.pyramid.at(self.scale).target
+        self.kernel = FitnessKernel(self.target_small, loss)
+
+        self.cache = FitnessCache(fitness_cache)
+        self.evals = 0
+        self.telemetry = telemetry
+        self.max_evals = int(max_evals) if max_evals else None
+        self.profiler = Profiler(profile)
+        self.resume = resume
+        self.checkpoint_path = checkpoint
+        self.checkpoint_every = float(checkpoint_every)
+        self.ckpt: CheckpointWriter | None = None
 
         self.best_fitness = float("inf")
-        self.best: Genotype | None = None
+        self.best: ArrayGenotype | None = None
+
+    def _fitness(self, g: ArrayGenotype) -> float:
+        if g.fitness is not None:
+            return g.fitness
+        key = g.key()
+        f = self.cache.get(key)
+        if f is None:
+            with self.profiler.phase("render"):
+                canvas = self.phen_small.render(g)
+            with self.profiler.phase("loss"):
+                f = self.kernel.loss(canvas)
+            self.evals += 1
+            self.cache.put(key, f)
+        g.fitness = f
+        return f
+
+    def _random_shape(self):
+        return random_shape(self.rng, self.width, self.height, self.target, self.shape_mode,
+                            min_size=6, max_size=int(min(self.width, self.height) * 0.35), alpha_floor=0.65,
+                            index=self.index, small_scale=self.scale)
+
+    def _init_individual(self) -> ArrayGenotype:
+        if self.init_candidates <= 1:
+            return ArrayGenotype.from_shapes(self._random_shape() for _ in range(self.n_shapes))
+
+        # each shape is the best of k proposals, batch-scored against the partial canvas
+        state = IncrementalCanvas(self.phen_small, self.target_small, kernel=self.kernel)
+        shapes = []
+        for _ in range(self.n_shapes):
+            cands = [self._random_shape() for _ in range(self.init_candidates)]
+            s = cands[int(np.argmin(state.score_batch(cands)))]
+            state.commit(s)
+            shapes.append(s)
+        return ArrayGenotype.from_shapes(shapes)
+
+    def init_population(self) -> List[ArrayGenotype]:
+        if self.resume is None:
+            return [self._init_individual() for _ in range(self.pop_size)]
+
+        # seed from a checkpoint: its population (or best genotype), padded to n_shapes,
+        # then mutated copies of those seeds up to pop_size
+        arrays = self.resume.population or [self.resume.shapes]
+        seeds = [ArrayGenotype(a.copy()) for a in arrays if len(a)][:self.pop_size]
+        if not seeds:
+            return [self._init_individual() for _ in range(self.pop_size)]
+        for g in seeds:
+            while len(g) < self.n_shapes:
+                g.append(self._random_shape())
+        pop = list(seeds)
+        while len(pop) < self.pop_size:
+            p = seeds[len(pop) % len(seeds)].copy()
+            self._mutate(p)
+            pop.append(p)
+        return pop
+
+    def evaluate(self, pop: List[ArrayGenotype]) -> List[Tuple[float, ArrayGenotype]]:
+        scored = [(self._fitness(g), g) for g in pop]
+        scored.sort(key=lambda x: x[0])
+        if scored[0][0] < self.best_fitness:
+            self.best_fitness = scored[0][0]
+            with self.profiler.phase("copy"):
+                self.best = scored[0][1].copy()
+        return scored
 
-    def _fitness(self, g: Genotype) -> float:
-        img = self.phen_small.render(g)
-        return l1_loss(self.target_small, img)
+    def next_generation(self, scored: List[Tuple[float, ArrayGenotype]]) -> List[ArrayGenotype]:
+        new_pop = [scored[0][1].copy(), scored[1][1].copy()]
 
-    def _init_individual(self) -> Genotype:
-        shapes = [
-            random_shape(self.width, self.height, self.target, self.shape_mode,
-                         min_size=6, max_size=int(min(self.width, self.height) * 0.35), alpha_floor=0.65)
-            for _ in range(self.n_shapes)
-        ]
-        return Genotype(shapes)
+        def pick_parent() -> ArrayGenotype:
+            k = 4
+            cand = self.rng.sample(scored[: max(6, self.pop_size // 2)], k=min(k, len(scored)))
+            cand.sort(key=lambda x: x[0])
+            return cand[0][1]
 
-    def run(self) -> Genotype:
-        start = time.time()
-        t_end = start + self.time_limit
-        viz = Visualizer(self.target) if self.enable_viz else None
+        while len(new_pop) < self.pop_size:
+            p = pick_parent().copy()
 
-        pop = [self._init_individual() for _ in range(self.pop_size)]
+            if self.rng.random() < self.mutation_rate:
+                self._mutate(p)
 
-        scored = [(self._fitness(g), g) for g in pop]
-        scored.sort(key=lambda x: x[0])
-        self.best_fitness = scored[0][0]
-        self.best = scored[0][1].copy()
+            new_pop.append(p)
 
-        gen = 0
-        last_print = 0.0
+        return new_pop
 
-        while time.time() < t_end:
-            gen += 1
-            scored = [(self._fitness(g), g) for g in pop]
-            scored.sort(key=lambda x: x[0])
-
-            if scored[0][0] < self.best_fitness:
-                self.best_fitness = scored[0][0]
-                self.best = scored[0][1].copy()
+    def _mutate(self, p: ArrayGenotype) -> None:
+        for _ in range(self.rng.randint(1, 4)):
+            idx = self.rng.randrange(len(p))
+            s = p[idx]
+            mutate_one_shape_inplace(self.rng, s, self.width, self.height, self.target, self.scale, 0.65,
+                                     index=self.index)
+            p[idx] = s
 
-            new_pop = [scored[0][1].copy(), scored[1][1].copy()]
+    def _checkpoint(self, start: float, scored: List[Tuple[float, ArrayGenotype]], force: bool = False) -> None:
+        if self.ckpt is None or self.best is None or not (force or self.ckpt.due()):
+            return
+        self.ckpt.submit(Checkpoint(
+            shapes=self.best.data.copy(), engine="ga", phase="gen", best_fitness=self.best_fitness,
+            evals=self.evals, elapsed=time.time() - start, population=[g.data.copy() for _, g in scored],
+            rng=self.rng.getstate(), meta={"width": self.width, "height": self.height, "n_shapes": self.n_shapes},
+        ))
 
-            def pick_parent() -> Genotype:
-                k = 4
-                cand = random.sample(scored[: max(6, self.pop_size // 2)], k=min(k, len(scored)))
-                cand.sort(key=lambda x: x[0])
-                return cand[0][1]
-
-            while len(new_pop) < self.pop_size:
-                p = pick_parent().copy()
+    def run(self) -> Genotype:
+        if self.resume is not None and self.resume.rng is not None:
+            self.rng.setstate(self.resume.rng)
+        self.ckpt = CheckpointWriter(self.checkpoint_path, self.checkpoint_every) if self.checkpoint_path else None
+        try:
+            with self.profiler.phase("run"):
+                return self._run()
+        finally:
+            if self.ckpt is not None:
+                self.ckpt.close()
+
+    def _run(self) -> Genotype:
+        start = time.time()
+        t_end = start + self.time_limit
+        prof = self.profiler
+        viz = Visualizer(self.target, self.background_bgr, self.viz_size, self.renderer, self.antialias) \
+            if self.enable_viz else None
 
-                if random.random() < self.mutation_rate:
-                    for _ in range(random.randint(1, 4)):
-                        idx = random.randrange(len(p.shapes))
-                        mutate_one_shape_inplace(p.shapes[idx], self.width, self.height, self.target, self.scale, 0.65)
+        with prof.phase("init"):
+            pop = self.init_population()
+            scored = self.evaluate(pop)
 
-                new_pop.append(p)
+        gen = 0
+        last_print = 0.0
 
-            pop = new_pop
+        while time.time() < t_end and (self.max_evals is None or self.evals < self.max_evals):
+            gen += 1
+            with prof.phase("evaluate"):
+                scored = self.evaluate(pop)
+            with prof.phase("breed"):
+                pop = self.next_generation(scored)
+            self._checkpoint(start, scored)
+            if self.telemetry is not None:
+                self.telemetry.record(time.time() - start, "gen", self.best_fitness, self.evals)
 
             now = time.time()
             if now - last_print >= 0.40:
                 pct = 100.0 * min(1.0, (now - start) / self.time_limit)
-                print(f"\r[{pct:5.1f}%] GA best L1={self.best_fitness:8.2f} gen={gen:4d}", end="", flush=True)
+                print(f"\r[{pct:5.1f}%] GA best {self.kernel.kind.upper()}={self.best_fitness:8.2f} gen={gen:4d} evals={self.evals}",
+                      end="", flush=True)
                 last_print = now
                 if viz and self.best:
-                    viz.update(self.phen_full.render(self.best))
+                    with prof.phase("viz"):
+                        viz.update(self.best)
 
+        if self.telemetry is not None:
+            self.telemetry.record(time.time() - start, "gen", self.best_fitness, self.evals, force=True)
+        self._checkpoint(start, scored, force=True)
         if viz:
             viz.close()
 
         print()
         assert self.best is not None
-        return self.best
+        return self.best.to_genotype()
@@ -2,14 +2,26 @@
 from __future__ import annotations
 
 import time
-import random
-import cv2
+from typing import Callable
 import numpy as np
 
+from core.anneal import REFINE_STRATEGIES, Annealer, apply_operator
 from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
 from core.phenotype import Phenotype
-from core.fitness import l1_loss, error_map_gray
+from core.color_fit import ColorFitter
+from core.fitness import FitnessKernel
+from core.incremental import IncrementalCanvas
+from core.parallel import CandidatePool
+from core.polish import polish_shape
+from core.render_cache import RenderCache
 from core.mutation import propose_shape_near, mutate_one_shape_inplace
+from core.schedule import ScaleSchedule
+from core.target_index import TargetPyramid
+from io_utils.serialization import Checkpoint, CheckpointWriter
+from utils.profiler import Profiler
+from utils.rng import RandomStream, Seed
+from utils.telemetry import Telemetry
 from utils.visualizer import Visualizer
 
 
@@ -21,9 +33,28 @@ class GreedyEngine:
             n_shapes: int,
             time_limit: float,
             enable_viz: bool = True,
+            viz_size: int = 0,
             fitness_scale: int = 4,
             candidates_per_shape: int = 45,
             refine_fraction: float = 0.60,
+            cache_every: int = 8,
+            cache_mb: int = 128,
+            color_fit: str = "sample",
+            scale_schedule: ScaleSchedule | None = None,
+            workers: int = 1,
+            renderer: str = "opencv",
+            antialias: bool = False,
+            telemetry: Telemetry | None = None,
+            max_evals: int | None = None,
+            profile: bool = False,
+            resume: Checkpoint | None = None,
+            checkpoint: str | None = None,
+            checkpoint_every: float = 30.0,
+            loss: str = "l1",
+            refine_strategy: str = "hill",
+            polish: int = 0,
+            polish_top: int = 1,
+            seed: Seed = None,
     ):
         self.target = target_bgr
         self.height, self.width = target_bgr.shape[:2]
@@ -31,173 +62,418 @@ class GreedyEngine:
         self.n_shapes = int(n_shapes)
         self.time_limit = float(time_limit)
         self.enable_viz = enable_viz
+        self.viz_size = max(0, int(viz_size))
+        self.renderer = renderer
+        self.antialias = bool(antialias)
 
         mean = self.target.mean(axis=(0, 1))
         self.background_bgr = tuple(int(c) for c in mean)
 
-        self.scale = max(2, int(fitness_scale))
+        self.rng = RandomStream(seed)
+        self.schedule = scale_schedule
+        self.workers = max(1, int(workers))
+        self.pool: CandidatePool | None = None
+        self._bind: Callable[[IncrementalCanvas], None] | None = None
+        self.telemetry = telemetry
+        self.evals = 0
+        self.max_evals = int(max_evals) if max_evals else None
+        self.profiler = Profiler(profile)
+        self.resume = resume
+        self.checkpoint_path = checkpoint
+        self.checkpoint_every = float(checkpoint_every)
+        self.ckpt: CheckpointWriter | None = None
         self.candidates = max(10, int(candidates_per_shape))
         self.refine_fraction = float(max(0.0, min(0.95, refine_fraction)))
+        self.cache_every = max(1, int(cache_every))
+        self.cache_bytes = max(1, int(cache_mb)) << 20
 
-        self.phen_small = Phenotype(self.width, self.height, self.background_bgr, scale=self.scale)
-        self.target_small = cv2.resize(
-            self.target,
-            (self.phen_small.width, self.phen_small.height),
-            interpolation=cv2.INTER_AREA,
-        )
-        self.phen_full = Phenotype(self.width, self.height, self.background_bgr, scale=1)
+        self.color_fit = color_fit
+        self.pyramid = TargetPyramid(self.target, scales=(1,))
+        self.index = self.pyramid.at(1)
+        self.loss = loss
+        if refine_strategy not in REFINE_STRATEGIES:
+            raise ValueError(f"Unknown refine strategy: {refine_strategy}")
+        self.refine_strategy = refine_strategy
+        self.annealer: Annealer | None = None
+        self.polish = max(0, int(polish))
+        self.polish_top = max(1, int(polish_top))
+        self._phens: dict[int, Phenotype] = {}
+        self._kernels: dict[int, FitnessKernel] = {}
+        self._use_scale(self.schedule.first if self.schedule else max(2, int(fitness_scale)))
 
         self.best_fitness = float("inf")
-        self.best: Genotype | None = None
+        self.best: ArrayGenotype | None = None
 
-    def _pick_hotspot(self, current_small: np.ndarray) -> tuple[int, int]:
-        em = error_map_gray(self.target_small, current_small)
-        flat = em.reshape(-1)
-        k = max(10, int(0.10 * flat.size))
-        idx = np.argpartition(flat, -k)[-k:]
-        pick = int(np.random.choice(idx))
-        y, x = divmod(pick, em.shape[1])
-        return int(x), int(y)
+    def _use_scale(self, scale: int) -> None:
+        self.scale = int(scale)
+        if self.scale not in self._phens:
+            self._phens[self.scale] = Phenotype(self.width, self.height, self.background_bgr, scale=self.scale,
+                                                renderer=self.renderer, antialias=self.antialias)
+        self.phen_small = self._phens[self.scale]
+        self.index_small = self.pyramid.at(self.scale)
+        self.target_small = self.index_small.target
+        if self.scale not in self._kernels:
+            self._kernels[self.scale] = FitnessKernel(self.target_small, self.loss)
+        self.kernel = self._kernels[self.scale]
+        self.fitter = None
+        if self.color_fit != "sample":
+            self.fitter = ColorFitter(self.phen_small, self.target_small, self.color_fit)
+
+    def _scheduled_scale(self, start: float, n_placed: int) -> int:
+        if self.schedule is None:
+            return self.scale
+        if self.schedule.by == "shapes":
+            return self.schedule.scale_at(n_placed / max(1, self.n_shapes))
+        return self.schedule.scale_at(self._progress(start))
+
+    def _progress(self, start: float) -> float:
+        """Fraction of the budget spent: wall clock, or evaluations if max_evals is set (whichever is ahead)."""
+        p = (time.time() - start) / max(1e-9, self.time_limit)
+        if self.max_evals:
+            p = max(p, self.evals / self.max_evals)
+        return p
+
+    def _rebase_best(self, arr: ArrayGenotype, current_fit: float | None = None) -> bool:
+        """
+        After a scale switch losses from the old scale no longer compare: re-score the
+        stored best at the new scale and keep the better of it and arr (whose loss is
+        current_fit, when already known). Returns True if the stored best won.
+        """
+        if current_fit is None:
+            current_fit = self.kernel.loss(self.phen_small.render(arr.to_genotype()))
+        if self.best is not None and self.best.key() != arr.key():
+            best_fit = self.kernel.loss(self.phen_small.render(self.best.to_genotype()))
+            if best_fit < current_fit:
+                self.best_fitness = best_fit
+                return True
+        self.best_fitness = current_fit
+        self.best = arr.copy()
+        return False
+
+    def _new_state(self, g: Genotype) -> IncrementalCanvas:
+        state = IncrementalCanvas(self.phen_small, self.target_small, g, kernel=self.kernel)
+        self._close_pool()
+        if self.workers > 1:
+            self.pool = CandidatePool(state, self.workers)
+        index, fitter = self.index_small, self.fitter
+
+        def bind(st: IncrementalCanvas) -> None:
+            # views of st's buffers: followed again when the pool moves st off shared memory
+            index.set_error(st.err)
+            if fitter:
+                fitter.canvas = st.canvas
+
+        bind(state)
+        self._bind = bind
+        return state
+
+    def _pick_hotspot(self) -> tuple[int, int]:
+        return self.index_small.sample_error(self.rng.random())
+
+    def _record(self, start: float, phase: str, accept_rate: float | None = None, force: bool = False) -> None:
+        if self.telemetry is not None:
+            self.telemetry.record(time.time() - start, phase, self.best_fitness, self.evals, accept_rate, force)
+
+    def _checkpoint(self, start: float, phase: str, arr: ArrayGenotype, loss: float, force: bool = False) -> None:
+        """Hand the current genotype (never worse than best) to the background writer when due."""
+        if self.ckpt is None or not (force or self.ckpt.due()):
+            return
+        self.ckpt.submit(Checkpoint(
+            shapes=arr.data.copy(), engine="greedy", phase=phase, best_fitness=loss, evals=self.evals,
+            elapsed=time.time() - start, rng=self.rng.getstate(),
+            meta={"width": self.width, "height": self.height, "n_shapes": self.n_shapes, "scale": self.scale},
+        ))
+
+    def _close_pool(self) -> None:
+        if self.pool:
+            self.pool.close(on_detach=self._bind)
+            self.pool = None
 
     def run(self) -> Genotype:
+        self.ckpt = CheckpointWriter(self.checkpoint_path, self.checkpoint_every) if self.checkpoint_path else None
+        try:
+            with self.profiler.phase("run"):
+                return self._run()
+        finally:
+            self._close_pool()
+            if self.ckpt is not None:
+                self.ckpt.close()
+
+    def _run(self) -> Genotype:
         start = time.time()
-        t_end = start + self.time_limit
-        t_refine_start = start + (1.0 - self.refine_fraction) * self.time_limit
+        refine_start = 1.0 - self.refine_fraction
+        prof = self.profiler
 
-        viz = Visualizer(self.target) if self.enable_viz else None
+        viz = Visualizer(self.target, self.background_bgr, self.viz_size, self.renderer, self.antialias) \
+            if self.enable_viz else None
 
         g = Genotype([])
-        current_small = self.phen_small.render(g)
-        current_fit = l1_loss(self.target_small, current_small)
+        arr = ArrayGenotype()  # compact mirror of g, snapshotted into self.best with one memcpy
+        if self.resume is not None:
+            # continue building (or go straight to refining) from the checkpointed genotype
+            arr = ArrayGenotype(self.resume.shapes.copy())
+            g = arr.to_genotype()
+            if self.resume.rng is not None:
+                self.rng.setstate(self.resume.rng)
+        with prof.phase("setup"):
+            state = self._new_state(g)
+        current_fit = state.loss
 
-        self.best = g.copy()
+        self.best = arr.copy()
         self.best_fitness = current_fit
 
-        i = 0
-        while i < self.n_shapes and time.time() < t_refine_start:
-            current_small = self.phen_small.render(g)
-            hx, hy = self._pick_hotspot(current_small)
-
-            ratio = i / max(1, self.n_shapes - 1)
-            max_size = int(max(6, (1.0 - ratio) * min(self.width, self.height) * 0.55))
-            min_size = 4 if ratio > 0.55 else 10
-
-            best_s = None
-            best_fit = current_fit
-
-            for _ in range(self.candidates):
-                s = propose_shape_near(
-                    width=self.width,
-                    height=self.height,
-                    target_bgr=self.target,
-                    shape_mode=self.shape_mode,
-                    hotspot_small=(hx, hy),
-                    small_scale=self.scale,
-                    min_size=min_size,
-                    max_size=max_size,
-                    alpha_floor=0.70,
-                )
-                tmp = g.copy()
-                tmp.shapes.append(s)
-                img = self.phen_small.render(tmp)
-                f = l1_loss(self.target_small, img)
-                if f < best_fit:
-                    best_fit = f
-                    best_s = s
-
-            if best_s is None:
-                best_s = propose_shape_near(
-                    width=self.width,
-                    height=self.height,
-                    target_bgr=self.target,
-                    shape_mode=self.shape_mode,
-                    hotspot_small=(hx, hy),
-                    small_scale=self.scale,
-                    min_size=min_size,
-                    max_size=max_size,
-                    alpha_floor=0.70,
-                )
-                tmp = g.copy()
-                tmp.shapes.append(best_s)
-                best_fit = l1_loss(self.target_small, self.phen_small.render(tmp))
-
-            g.shapes.append(best_s)
-            current_fit = best_fit
-            i += 1
-
-            if current_fit < self.best_fitness:
-                self.best_fitness = current_fit
-                self.best = g.copy()
-
-            if i % 5 == 0:
-                pct = 100.0 * min(1.0, (time.time() - start) / self.time_limit)
-                print(f"\r[{pct:5.1f}%] build L1={self.best_fitness:8.2f} shapes={len(g):4d}/{self.n_shapes}",
-                      end="", flush=True)
-                if viz and self.best:
-                    viz.update(self.phen_full.render(self.best))
-
-        while len(g) < self.n_shapes and time.time() < t_refine_start:
-            current_small = self.phen_small.render(g)
-            hx, hy = self._pick_hotspot(current_small)
-            s = propose_shape_near(
-                width=self.width,
-                height=self.height,
-                target_bgr=self.target,
-                shape_mode=self.shape_mode,
-                hotspot_small=(hx, hy),
-                small_scale=self.scale,
-                min_size=6,
-                max_size=int(max(10, min(self.width, self.height) * 0.25)),
-                alpha_floor=0.70,
-            )
-            g.shapes.append(s)
-            current_fit = l1_loss(self.target_small, self.phen_small.render(g))
-            if current_fit < self.best_fitness:
-                self.best_fitness = current_fit
-                self.best = g.copy()
+        i = len(g)
+        with prof.phase("build"):
+            while i < self.n_shapes and self._progress(start) < refine_start:
+                scale = self._scheduled_scale(start, i)
+                if scale != self.scale:
+                    # the genotype lives in full-res coordinates: re-render at the new scale, nothing is lost
+                    with prof.phase("rescale"):
+                        self._use_scale(scale)
+                        state = self._new_state(g)
+                        current_fit = state.loss
+                        self._rebase_best(arr, current_fit)
+
+                with prof.phase("hotspot"):
+                    hx, hy = self._pick_hotspot()
+
+                ratio = i / max(1, self.n_shapes - 1)
+                max_size = int(max(6, (1.0 - ratio) * min(self.width, self.height) * 0.55))
+                min_size = 4 if ratio > 0.55 else 10
+
+                with prof.phase("propose"):
+                    cands = [
+                        propose_shape_near(
+                            rng=self.rng,
+                            width=self.width,
+                            height=self.height,
+                            target_bgr=self.target,
+                            shape_mode=self.shape_mode,
+                            hotspot_small=(hx, hy),
+                            small_scale=self.scale,
+                            min_size=min_size,
+                            max_size=max_size,
+                            alpha_floor=0.70,
+                            fitter=self.fitter,
+                            index=self.index,
+                        )
+                        for _ in range(self.candidates)
+                    ]
+                with prof.phase("score"):
+                    fits = (self.pool or state).score_batch(cands)
+                self.evals += len(cands)
+                k = int(np.argmin(fits))
+                best_s = cands[k] if fits[k] < current_fit else None
+
+                if best_s is not None and self.polish:
+                    # hill-climb the top candidates on the frozen canvas, keep the best result
+                    with prof.phase("polish"):
+                        best_f = float(fits[k])
+                        for j in np.argsort(fits)[:self.polish_top]:
+                            if fits[j] >= current_fit:
+                                break
+                            s, f = polish_shape(self.rng, state, cands[j], float(fits[j]), self.polish,
+                                                self.width, self.height, self.target, self.scale, 0.70,
+                                                fitter=self.fitter, index=self.index)
+                            self.evals += self.polish
+                            if f < best_f:
+                                best_s, best_f = s, f
+
+                if best_s is None:
+                    with prof.phase("propose"):
+                        best_s = propose_shape_near(
+                            rng=self.rng,
+                            width=self.width,
+                            height=self.height,
+                            target_bgr=self.target,
+                            shape_mode=self.shape_mode,
+                            hotspot_small=(hx, hy),
+                            small_scale=self.scale,
+                            min_size=min_size,
+                            max_size=max_size,
+                            alpha_floor=0.70,
+                            fitter=self.fitter,
+                            index=self.index,
+                        )
+
+                with prof.phase("commit"):
+                    g.shapes.append(best_s)
+                    arr.append(best_s)
+                    current_fit = state.commit(best_s)
+                    self.index_small.touch_error(self.kernel.expand(self.phen_small.roi(best_s)))
+                i += 1
+
+                if current_fit < self.best_fitness:
+                    self.best_fitness = current_fit
+                    with prof.phase("copy"):
+                        self.best = arr.copy()
+                self._record(start, "build")
+                self._checkpoint(start, "build", arr, current_fit)
+
+                if i % 5 == 0:
+                    pct = 100.0 * min(1.0, self._progress(start))
+                    print(f"\r[{pct:5.1f}%] build {self.loss.upper()}={self.best_fitness:8.2f} shapes={len(g):4d}/{self.n_shapes}",
+                          end="", flush=True)
+                    if viz and self.best:
+                        with prof.phase("viz"):
+                            viz.update(self.best)
+
+            while len(g) < self.n_shapes and self._progress(start) < refine_start:
+                scale = self._scheduled_scale(start, len(g))
+                if scale != self.scale:
+                    with prof.phase("rescale"):
+                        self._use_scale(scale)
+                        state = self._new_state(g)
+                        self._rebase_best(arr, state.loss)
+                with prof.phase("hotspot"):
+                    hx, hy = self._pick_hotspot()
+                with prof.phase("propose"):
+                    s = propose_shape_near(
+                        rng=self.rng,
+                        width=self.width,
+                        height=self.height,
+                        target_bgr=self.target,
+                        shape_mode=self.shape_mode,
+                        hotspot_small=(hx, hy),
+                        small_scale=self.scale,
+                        min_size=6,
+                        max_size=int(max(10, min(self.width, self.height) * 0.25)),
+                        alpha_floor=0.70,
+                        fitter=self.fitter,
+                        index=self.index,
+                    )
+                with prof.phase("commit"):
+                    g.shapes.append(s)
+                    arr.append(s)
+                    current_fit = state.commit(s)
+                    self.index_small.touch_error(self.kernel.expand(self.phen_small.roi(s)))
+                if current_fit < self.best_fitness:
+                    self.best_fitness = current_fit
+                    with prof.phase("copy"):
+                        self.best = arr.copy()
+                self._record(start, "build")
+                self._checkpoint(start, "build", arr, current_fit)
+
+        self._close_pool()
+        idx = 0
+
+        def refine_cache() -> RenderCache:
+            c = RenderCache(self.phen_small, self.target_small, g, every=self.cache_every,
+                            max_bytes=self.cache_bytes, kernel=self.kernel)
+            if self.fitter:
+                self.fitter.under = lambda roi: c.under(g, idx, roi)
+            return c
+
+        if self.schedule and self.schedule.by == "shapes":
+            self._use_scale(self.schedule.last)
+        elif self.schedule:
+            self._use_scale(self._scheduled_scale(start, len(g)))
+        with prof.phase("setup"):
+            if self.schedule and self._rebase_best(arr):
+                # refine from the best genotype: the build may have ended on a worse one
+                arr = self.best.copy()
+                g = arr.to_genotype()
+            cache = refine_cache()
+        current_fit = cache.loss
 
         mut_attempt = 0
         mut_accept = 0
+        annealer = self.annealer = Annealer(self.rng) if self.refine_strategy == "anneal" else None
+        refine_from = min(self._progress(start), 0.999)  # the build may end early, on the shape count
         last_print = 0.0
+        self._record(start, "refine", force=True)
 
-        while time.time() < t_end and len(g) > 0:
-            mut_attempt += 1
-            idx = random.randrange(len(g.shapes))
-            old = g.shapes[idx].copy()
-
-            mutate_one_shape_inplace(
-                s=g.shapes[idx],
-                width=self.width,
-                height=self.height,
-                target_bgr=self.target,
-                small_scale=self.scale,
-                alpha_floor=0.70,
-            )
-
-            new_fit = l1_loss(self.target_small, self.phen_small.render(g))
-            if new_fit <= current_fit:
-                current_fit = new_fit
-                mut_accept += 1
+        with prof.phase("refine"):
+            while self._progress(start) < 1.0 and len(g) > 0:
+                mut_attempt += 1
+                self.evals += 1
+                idx = self.rng.randrange(len(g.shapes))
+                with prof.phase("mutate"):
+                    old = g.shapes[idx].copy()
+
+                    if annealer is None:
+                        mutate_one_shape_inplace(
+                            rng=self.rng,
+                            s=g.shapes[idx],
+                            width=self.width,
+                            height=self.height,
+                            target_bgr=self.target,
+                            small_scale=self.scale,
+                            alpha_floor=0.70,
+                            fitter=self.fitter,
+                            index=self.index,
+                        )
+                    else:
+                        op = annealer.choose(old)
+                        apply_operator(
+                            rng=self.rng,
+                            s=g.shapes[idx],
+                            op=op,
+                            step=annealer.steps[op],
+                            width=self.width,
+                            height=self.height,
+                            target_bgr=self.target,
+                            small_scale=self.scale,
+                            alpha_floor=0.70,
+                            fitter=self.fitter,
+                            index=self.index,
+                        )
+
+                with prof.phase("score"):
+                    new_fit = cache.replace(g, idx, old)
+                with prof.phase("commit"):
+                    if annealer is None:
+                        ok = new_fit <= current_fit
+                    else:
+                        # temperature follows the share of the refine budget still left
+                        q = (self._progress(start) - refine_from) / (1.0 - refine_from)
+                        ok = annealer.accept(new_fit - current_fit, q)
+                        annealer.feedback(op, new_fit - current_fit)
+                    if ok:
+                        cache.accept()
+                        arr[idx] = g.shapes[idx]
+                        current_fit = new_fit
+                        mut_accept += 1
+                    else:
+                        g.shapes[idx] = old  # inverser
+                        cache.reject()
                 if current_fit < self.best_fitness:
                     self.best_fitness = current_fit
-                    self.best = g.copy()
-            else:
-                g.shapes[idx] = old  # inverser
-
-            now = time.time()
-            if now - last_print >= 0.35:
-                pct = 100.0 * min(1.0, (now - start) / self.time_limit)
-                rate = (mut_accept / mut_attempt) if mut_attempt else 0.0
-                print(f"\r[{pct:5.1f}%] refine L1={self.best_fitness:8.2f} shapes={len(g):4d}/{self.n_shapes} "
-                      f"mut={mut_attempt}/{mut_accept} ({rate * 100:4.1f}%)",
-                      end="", flush=True)
-                last_print = now
-                if viz and self.best:
-                    viz.update(self.phen_full.render(self.best))
+                    with prof.phase("copy"):
+                        self.best = arr.copy()
+                self._record(start, "refine", mut_accept / mut_attempt)
+                self._checkpoint(start, "refine", self.best, self.best_fitness)
+
+                now = time.time()
+                if now - last_print >= 0.35:
+                    pct = 100.0 * min(1.0, self._progress(start))
+                    rate = (mut_accept / mut_attempt) if mut_attempt else 0.0
+                    print(f"\r[{pct:5.1f}%] refine {self.loss.upper()}={self.best_fitness:8.2f} shapes={len(g):4d}/{self.n_shapes} "
+                          f"mut={mut_attempt}/{mut_accept} ({rate * 100:4.1f}%)",
+                          end="", flush=True)
+                    last_print = now
+                    if viz and self.best:
+                        with prof.phase("viz"):
+                            viz.update(self.best)
+
+                    scale = self._scheduled_scale(start, len(g))
+                    if self.schedule and self.schedule.by == "time" and scale != self.scale:
+                        with prof.phase("rescale"):
+                            self._use_scale(scale)
+                            if self._rebase_best(arr):
+                                # annealing may sit uphill: carry the better genotype to the new scale
+                                arr = self.best.copy()
+                                g = arr.to_genotype()
+                            cache = refine_cache()
+                        current_fit = cache.loss
 
+        self._record(start, "refine", mut_accept / max(1, mut_attempt), force=True)
+        self._checkpoint(start, "refine", self.best, self.best_fitness, force=True)
         if viz:
             viz.close()
 
         print()
+        if annealer is not None:
+            print(annealer.summary())
         assert self.best is not None
-        return self.best
+        return self.best.to_genotype()
@@ -0,0 +1,247 @@
+# engine_islands.py
+from __future__ import annotations
+
+import dataclasses
+import multiprocessing as mp
+import queue
+import time
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+from core.engine_ga import GAEngine
+from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
+from io_utils.serialization import Checkpoint, CheckpointWriter
+from utils.profiler import Profiler
+from utils.rng import Seed, spawn_seeds
+from utils.telemetry import Telemetry
+from utils.visualizer import Visualizer
+
+TOPOLOGIES = ("ring", "all")
+
+
+def _neighbours(i: int, k: int, topology: str) -> List[int]:
+    if k <= 1:
+        return []
+    if topology == "ring":
+        return [(i + 1) % k]
+    return [j for j in range(k) if j != i]
+
+
+def _island_main(island: int, n_islands: int, seed: np.random.SeedSequence, ga_kwargs: Dict[str, Any],
+                 deadline: float, interval: float, migrants: int, topology: str,
+                 inboxes: List[Any], results: Any) -> None:
+    eng = GAEngine(enable_viz=False, seed=seed, **ga_kwargs)
+    stats: Dict[str, Any] = {"island": island, "generations": 0, "evaluations": 0,
+                             "sent": 0, "received": 0, "history": []}
+
+    prof = eng.profiler
+    with prof.phase("init"):
+        pop = eng.init_population()
+        scored = eng.evaluate(pop)
+    next_migration = time.time() + interval
+
+    while time.time() < deadline:
+        now = time.time()
+        if now >= next_migration:
+            next_migration = now + interval
+            elites = [(f, g.data) for f, g in scored[:migrants]]
+            for j in _neighbours(island, n_islands, topology):
+                inboxes[j].put((island, elites))
+                stats["sent"] += len(elites)
+
+            immigrants: List[Tuple[float, ArrayGenotype]] = []
+            while True:
+                try:
+                    _, batch = inboxes[island].get_nowait()
+                except queue.Empty:
+                    break
+                immigrants += [(f, ArrayGenotype(a, fitness=f)) for f, a in batch]
+            if immigrants:
+                stats["received"] += len(immigrants)
+                # immigrants replace the worst individuals
+                scored = sorted(scored[:max(2, len(scored) - len(immigrants))] + immigrants, key=lambda x: x[0])
+                scored = scored[:eng.pop_size]
+
+            stats["history"].append((round(now - (deadline - eng.time_limit), 3), eng.best_fitness))
+            results.put(("status", island, eng.best_fitness, eng.best.data, eng.evals))
+
+        with prof.phase("breed"):
+            pop = eng.next_generation(scored)
+        with prof.phase("evaluate"):
+            scored = eng.evaluate(pop)
+        stats["generations"] += 1
+
+    stats["evaluations"] = eng.evals
+    stats["cache_hits"] = eng.cache.hits
+    stats["best_fitness"] = eng.best_fitness
+    stats["profile"] = prof.stats
+    results.put(("done", island, eng.best_fitness, eng.best.data, stats))
+
+
+class IslandGAEngine:
+    """
+    K GA populations, one process each. Every `migration_interval` seconds
+    each island sends its `migrants` best genotypes (as SHAPE_DTYPE record arrays,
+    see core/codec.py) to its neighbours on a ring or all-to-all topology;
+    received immigrants replace the worst individuals.
+    """
+
+    def __init__(
+            self,
+            target_bgr: np.ndarray,
+            shape_mode: str,
+            n_shapes: int,
+            time_limit: float,
+            enable_viz: bool = True,
+            viz_size: int = 0,
+            fitness_scale: int = 4,
+            population_size: int = 20,
+            mutation_rate: float = 0.25,
+            init_candidates: int = 1,
+            fitness_cache: int = 256,
+            islands: int = 4,
+            migration_interval: float = 2.0,
+            migrants: int = 2,
+            topology: str = "ring",
+            seed: Seed = None,
+            renderer: str = "opencv",
+            antialias: bool = False,
+            telemetry: Telemetry | None = None,
+            profile: bool = False,
+            resume: Checkpoint | None = None,
+            checkpoint: str | None = None,
+            checkpoint_every: float = 30.0,
+            loss: str = "l1",
+    ):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown migration topology: {topology}")
+        self.target = target_bgr
+        self.height, self.width = target_bgr.shape[:2]
+        self.time_limit = float(time_limit)
+        self.enable_viz = enable_viz
+        self.viz_size = max(0, int(viz_size))
+        self.renderer = renderer
+        self.antialias = bool(antialias)
+        self.islands = max(1, int(islands))
+        self.migration_interval = max(0.05, float(migration_interval))
+        self.migrants = max(1, int(migrants))
+        self.topology = topology
+        self.seed = seed
+        self.telemetry = telemetry
+        self.profiler = Profiler(profile)
+        self.checkpoint_path = checkpoint
+        self.loss = loss
+        self.checkpoint_every = float(checkpoint_every)
+
+        mean = self.target.mean(axis=(0, 1))
+        self.background_bgr = tuple(int(c) for c in mean)
+
+        self.ga_kwargs: Dict[str, Any] = dict(
+            target_bgr=target_bgr,
+            shape_mode=shape_mode,
+            n_shapes=n_shapes,
+            time_limit=time_limit,
+            fitness_scale=fitness_scale,
+            population_size=population_size,
+            mutation_rate=mutation_rate,
+            init_candidates=init_candidates,
+            fitness_cache=fitness_cache,
+            renderer=renderer,
+            antialias=antialias,
+            profile=profile,
+            loss=loss,
+            # every island seeds from the checkpoint; each keeps its own seeded RNG stream
+            resume=dataclasses.replace(resume, rng=None) if resume is not None else None,
+        )
+
+        self.best_fitness = float("inf")
+        self.best: Genotype | None = None
+        self.stats: List[Dict[str, Any]] = []
+
+    def _island_seeds(self) -> List[np.random.SeedSequence]:
+        """One independent stream per island, spawned from the run seed (fresh entropy without one)."""
+        return spawn_seeds(self.seed, self.islands)
+
+    def run(self) -> Genotype:
+        start = time.time()
+        deadline = start + self.time_limit
+        viz = Visualizer(self.target, self.background_bgr, self.viz_size, self.renderer, self.antialias) \
+            if self.enable_viz else None
+        ckpt = CheckpointWriter(self.checkpoint_path, self.checkpoint_every) if self.checkpoint_path else None
+        best_enc: np.ndarray | None = None
+
+        ctx = mp.get_context()
+        inboxes = [ctx.Queue() for _ in range(self.islands)]
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(
+                target=_island_main,
+                args=(i, self.islands, seed, self.ga_kwargs, deadline, self.migration_interval,
+                      self.migrants, self.topology, inboxes, results),
+                daemon=True,
+            )
+            for i, seed in enumerate(self._island_seeds())
+        ]
+        for p in procs:
+            p.start()
+
+        island_best = [float("inf")] * self.islands
+        island_evals = [0] * self.islands
+        stats: Dict[int, Dict[str, Any]] = {}
+        try:
+            while len(stats) < self.islands:
+                try:
+                    msg = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in procs):
+                        raise RuntimeError("All islands exited without reporting a result.")
+                    continue
+
+                island, fit, enc = msg[1], msg[2], msg[3]
+                island_best[island] = fit
+                if msg[0] == "done":
+                    stats[island] = msg[4]
+                    island_evals[island] = msg[4]["evaluations"]
+                else:
+                    island_evals[island] = msg[4]
+                if fit < self.best_fitness:
+                    self.best_fitness = fit
+                    self.best = ArrayGenotype(enc).to_genotype()
+                    best_enc = enc
+                    if viz:
+                        viz.update(ArrayGenotype(enc))
+
+                if ckpt is not None and best_enc is not None and (ckpt.due() or len(stats) == self.islands):
+                    ckpt.submit(Checkpoint(
+                        shapes=best_enc, engine="islands", phase="islands", best_fitness=self.best_fitness,
+                        evals=sum(island_evals), elapsed=time.time() - start,
+                        meta={"width": self.width, "height": self.height, "islands": self.islands},
+                    ))
+
+                if self.telemetry is not None:
+                    self.telemetry.record(time.time() - start, "islands", self.best_fitness, sum(island_evals),
+                                          force=len(stats) == self.islands)
+
+                pct = 100.0 * min(1.0, (time.time() - start) / self.time_limit)
+                per_island = " ".join(f"{f:6.2f}" for f in island_best)
+                print(f"\r[{pct:5.1f}%] islands best {self.loss.upper()}={self.best_fitness:8.2f} [{per_island}]", end="", flush=True)
+        finally:
+            for p in procs:
+                p.join(timeout=5.0)
+                if p.is_alive():
+                    p.terminate()
+            if viz:
+                viz.close()
+            if ckpt is not None:
+                ckpt.close()
+
+        self.stats = [stats[i] for i in sorted(stats)]
+        for st in self.stats:
+            self.profiler.merge(st.pop("profile"), prefix=f"island{st['island']}")
+        print()
+        for st in self.stats:
+            print(f"  island {st['island']}: best {self.loss.upper()}={st['best_fitness']:8.2f} gen={st['generations']} "
+                  f"evals={st['evaluations']} migrants out/in={st['sent']}/{st['received']}")
+        assert self.best is not None
+        return self.best
@@ -0,0 +1,262 @@
+# engine_tiled.py
+from __future__ import annotations
+
+import math
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from core.fitness import FitnessKernel
+from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
+from core.shapes import Rectangle
+from utils.profiler import Profiler
+from utils.rng import Seed, spawn_seeds
+from utils.telemetry import Telemetry
+
+
+@dataclass(frozen=True)
+class Tile:
+    """Tile bounds in full-image pixels; feather_x/y = width of the overlap with the tile drawn before it
+    on the left / above (0 on the image border), blended in by a linear ramp."""
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    feather_x: int = 0
+    feather_y: int = 0
+
+    @property
+    def width(self) -> int:
+        return self.x1 - self.x0
+
+    @property
+    def height(self) -> int:
+        return self.y1 - self.y0
+
+
+def _starts(length: int, size: int, overlap: int) -> List[int]:
+    if length <= size:
+        return [0]
+    n = math.ceil((length - overlap) / (size - overlap))
+    return [round(i * (length - size) / (n - 1)) for i in range(n)]
+
+
+def plan_tiles(width: int, height: int, size: int, overlap: int = 32) -> List[Tile]:
+    """Row-major grid of tiles of at most size x size covering the image, evenly spread, overlapping >= overlap."""
+    size = max(16, int(size))
+    overlap = max(0, min(int(overlap), size // 2))
+    xs, ys = _starts(width, size, overlap), _starts(height, size, overlap)
+    tiles = []
+    for j, y0 in enumerate(ys):
+        y1 = min(height, y0 + size)
+        fy = ys[j - 1] + size - y0 if j else 0
+        for i, x0 in enumerate(xs):
+            x1 = min(width, x0 + size)
+            fx = xs[i - 1] + size - x0 if i else 0
+            tiles.append(Tile(x0, y0, x1, y1, fx, fy))
+    return tiles
+
+
+def _tile_main(k: int, crop: np.ndarray, seed: np.random.SeedSequence, engine_cls: type,
+               engine_kwargs: Dict[str, Any]) -> Tuple[int, np.ndarray, float, Tuple[int, int, int], dict, int]:
+    """Worker: optimise one tile; only the tile's pixels live in this process."""
+    eng = engine_cls(crop, seed=seed, **engine_kwargs)
+    best = eng.run()
+    evals = int(getattr(eng, "evals", 0))
+    data = ArrayGenotype.from_genotype(best).data
+    return k, data, float(eng.best_fitness), eng.background_bgr, eng.profiler.stats, evals
+
+
+def _background_tile(k: int, crop: np.ndarray, loss: str) -> Tuple[int, np.ndarray, float, Tuple[int, int, int], dict, int]:
+    """A tile with no shape budget: only its background rectangle, no engine run."""
+    bg = tuple(int(c) for c in crop.mean(axis=(0, 1)))
+    fit = FitnessKernel(crop, loss).loss(np.full_like(crop, bg))
+    return k, ArrayGenotype().data, float(fit), bg, {}, 0
+
+
+class TiledEngine:
+    """
+    Memory-bounded mode for very large images: overlapping tiles are optimised
+    independently by `engine_cls` (greedy or GA) in worker processes, each
+    holding only its tile, and stitched back in global coordinates. Every
+    tile is drawn over its own background; io_utils.svg feathers the seams
+    with masks ramping across the overlap with the previously drawn tiles.
+
+    The shape budget (less one background rectangle per tile) is split by the
+    area each tile owns; tiles run in waves of `jobs` processes
+    and each wave gets an equal share of the time limit. A tile left with no
+    shape is not optimised at all: it is only its background rectangle.
+    """
+
+    def __init__(
+            self,
+            target_bgr: np.ndarray,
+            engine_cls: type,
+            n_shapes: int,
+            time_limit: float,
+            tile_size: int = 1024,
+            overlap: int = 32,
+            jobs: int = 1,
+            seed: Seed = None,
+            telemetry: Telemetry | None = None,
+            profile: bool = False,
+            **engine_kwargs: Any,
+    ):
+        self.target = target_bgr
+        self.height, self.width = target_bgr.shape[:2]
+        self.engine_cls = engine_cls
+        self.n_shapes = int(n_shapes)
+        self.time_limit = float(time_limit)
+        self.tiles = plan_tiles(self.width, self.height, tile_size, overlap)
+        self.jobs = max(1, min(int(jobs), len(self.tiles)))
+        self.seed = seed
+        self.telemetry = telemetry
+        self.profiler = Profiler(profile)
+        # per-tile engines: no viz window per worker, no per-tile checkpoints or telemetry
+        for key in ("enable_viz", "telemetry", "resume", "checkpoint"):
+            engine_kwargs.pop(key, None)
+        self.engine_kwargs = dict(engine_kwargs, enable_viz=False, profile=profile)
+        self.loss = str(engine_kwargs.get("loss", "l1"))
+
+        mean = self.target.mean(axis=(0, 1))
+        self.background_bgr = tuple(int(c) for c in mean)
+
+        self.best_fitness = float("inf")
+        self.best: Genotype | None = None
+        self.spans: List[Tuple[int, int]] = []  # [start, stop) of each tile's shapes in self.best
+        self.evals = 0
+
+    def _tile_seeds(self) -> List[np.random.SeedSequence]:
+        return spawn_seeds(self.seed, len(self.tiles))
+
+    def _owned_areas(self) -> List[float]:
+        """Area each tile owns when every overlap is split at its middle: the areas sum to the image area."""
+        def bounds(starts: List[float], length: int) -> Dict[float, float]:
+            edges = sorted(set(starts)) + [length]
+            return {s: edges[i + 1] - s for i, s in enumerate(edges[:-1])}
+        lefts = [t.x0 + t.feather_x / 2.0 for t in self.tiles]
+        tops = [t.y0 + t.feather_y / 2.0 for t in self.tiles]
+        xs, ys = bounds(lefts, self.width), bounds(tops, self.height)
+        return [xs[l] * ys[t] for l, t in zip(lefts, tops)]
+
+    def _shape_counts(self) -> List[int]:
+        """
+        Per-tile shape budgets summing to n_shapes minus the one background
+        rectangle per tile that _stitch adds, split by owned area with
+        largest-remainder rounding. Below one shape per tile, only the
+        background rectangles remain.
+        """
+        budget = max(0, self.n_shapes - len(self.tiles))
+        areas = self._owned_areas()
+        total = sum(areas) or 1.0
+        quotas = [budget * a / total for a in areas]
+        counts = [int(q) for q in quotas]
+        by_remainder = sorted(range(len(quotas)), key=lambda k: counts[k] - quotas[k])
+        for k in by_remainder[:budget - sum(counts)]:
+            counts[k] += 1
+        return counts
+
+    def _tile_kwargs(self, n: int) -> Dict[str, Any]:
+        waves = math.ceil(len(self.tiles) / self.jobs)
+        return dict(self.engine_kwargs, n_shapes=n, time_limit=self.time_limit / waves)
+
+    def run(self) -> Genotype:
+        start = time.time()
+        results: Dict[int, Tuple[np.ndarray, float, Tuple[int, int, int]]] = {}
+        pending = deque(zip(range(len(self.tiles)), self.tiles, self._tile_seeds(), self._shape_counts()))
+        with self.profiler.phase("run"), ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            running = set()
+            while pending or running:
+                # at most `jobs` crops are alive (pickled) at a time
+                while pending and len(running) < self.jobs:
+                    k, t, seed, n = pending.popleft()
+                    crop = np.ascontiguousarray(self.target[t.y0:t.y1, t.x0:t.x1])
+                    if n == 0:
+                        self._collect(start, results, _background_tile(k, crop, self.loss))
+                        continue
+                    running.add(pool.submit(_tile_main, k, crop, seed, self.engine_cls, self._tile_kwargs(n)))
+                if not running:
+                    continue
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    self._collect(start, results, fut.result())
+        print()
+        self.best = self._stitch(results)
+        return self.best
+
+    def _collect(self, start: float, results: Dict[int, Tuple[np.ndarray, float, Tuple[int, int, int]]],
+                 res: Tuple[int, np.ndarray, float, Tuple[int, int, int], dict, int]) -> None:
+        k, data, fit, bg, stats, evals = res
+        results[k] = (data, fit, bg)
+        self.profiler.merge(stats, prefix=f"tile{k}")
+        self.evals += evals
+        self.best_fitness = self._weighted_loss(results)
+        if self.telemetry is not None:
+            self.telemetry.record(time.time() - start, "tiles", self.best_fitness, self.evals,
+                                  force=len(results) == len(self.tiles))
+        pct = 100.0 * len(results) / len(self.tiles)
+        print(f"\r[{pct:5.1f}%] tiles {len(results)}/{len(self.tiles)} {self.loss.upper()}={self.best_fitness:8.2f}",
+              end="", flush=True)
+
+    def _weighted_loss(self, results: Dict[int, Tuple[np.ndarray, float, Tuple[int, int, int]]]) -> float:
+        area = {k: self.tiles[k].width * self.tiles[k].height for k in results}
+        return sum(results[k][1] * a for k, a in area.items()) / max(1, sum(area.values()))
+
+    def _stitch(self, results: Dict[int, Tuple[np.ndarray, float, Tuple[int, int, int]]]) -> Genotype:
+        """Tiles in drawing order, each as an opaque background rectangle then its shapes, moved to global coords."""
+        shapes = []
+        self.spans = []
+        for k, t in enumerate(self.tiles):
+            data, _, bg = results[k]
+            begin = len(shapes)
+            b, g, r = bg
+            shapes.append(Rectangle(t.x0 + t.width // 2, t.y0 + t.height // 2, t.width, t.height,
+                                    (r, g, b), 1.0, 0.0))
+            for s in ArrayGenotype(data).shapes:
+                s.cx += t.x0
+                s.cy += t.y0
+                shapes.append(s)
+            self.spans.append((begin, len(shapes)))
+        return Genotype(shapes, self.best_fitness)
+
+
+def check_shape_counts(size: Tuple[int, int] = (300, 200), tile: int = 128, seed: int = 0) -> List[str]:
+    """
+    Tiled GA runs on a random image with --n below, at and above the tile
+    count: each must return max(n, tiles) shapes. Returns the failures.
+    """
+    from core.engine_ga import GAEngine
+
+    w, h = size
+    target = np.random.default_rng(seed).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    n_tiles = len(plan_tiles(w, h, tile))
+    failures = []
+    for n in (1, n_tiles, n_tiles + 3):
+        eng = TiledEngine(target, GAEngine, n_shapes=n, time_limit=2.0, tile_size=tile, jobs=2, seed=seed,
+                          shape_mode="mixed", max_evals=40)
+        got = len(eng.run().shapes)
+        if got != max(n, n_tiles):
+            failures.append(f"n={n} tiles={n_tiles}: {got} shapes (expected {max(n, n_tiles)})")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """python -m core.engine_tiled --check : shape budget regression check of the tiled mode."""
+    argv = sys.argv[1:] if argv is None else argv
+    if "--check" not in argv:
+        print("usage: python -m core.engine_tiled --check")
+        return 2
+    failures = check_shape_counts()
+    for f in failures:
+        print("FAIL", f)
+    print(f"{len(failures)} shape count failure(s)." if failures else "Shape counts OK.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
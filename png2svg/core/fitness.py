@@ -1,14 +1,180 @@
 # fitness.py
 from __future__ import annotations
+from collections import OrderedDict
+from typing import Optional, Tuple
 import numpy as np
 import cv2
 
+ROI = Tuple[int, int, int, int]
+LOSSES = ("l1", "l2", "luma", "ssim")
+LUMA_WEIGHTS = (29, 150, 77)  # BT.601 luma in 1/256 (B, G, R), sums to 256
+SSIM_RADIUS = 3  # 7x7 box window
+SSIM_UNIT = 4096  # fixed-point units of (1 - SSIM) per pixel
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
 
 def l1_loss(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.mean(np.abs(a.astype(np.float32) - b.astype(np.float32))))
 
 
+def _box(a: np.ndarray) -> np.ndarray:
+    k = 2 * SSIM_RADIUS + 1
+    return cv2.boxFilter(a, -1, (k, k), normalize=True)
+
+
+class FitnessKernel:
+    """
+    Loss against a fixed uint8 target, created once per engine and scale.
+
+    Every loss is the sum of an integer per-pixel error map divided by
+    n_values, so the incremental paths (IncrementalCanvas, RenderCache)
+    keep adding and subtracting bbox sums whatever the loss:
+
+      l1    sum of |diff| over channels (n_values = pixels x 3)
+      l2    sum of diff^2 over channels (n_values = pixels x 3)
+      luma  |diff| weighted by BT.601 luma weights (n_values = pixels x 256)
+      ssim  (1 - SSIM) of the luma, 7x7 windows, at the fitness scale, in
+            1/4096 units (n_values = pixels x 4096 / 100: 100 x mean(1 - SSIM))
+
+    SSIM errors depend on a window around each pixel: a change inside a roi
+    moves the error map over the roi grown by `halo`, recomputed from the
+    canvas over the roi grown by 2 x halo. Full-image losses reuse scratch
+    buffers and exact integer reductions (OpenCV L1 norm, per-channel sums
+    of |diff| or |diff|^2), without float copies of the images.
+    """
+
+    def __init__(self, target_bgr: np.ndarray, kind: str = "l1"):
+        if kind not in LOSSES:
+            raise ValueError(f"Unknown loss: {kind}")
+        self.kind = kind
+        self.target = np.ascontiguousarray(target_bgr, dtype=np.uint8)
+        self.height, self.width = self.target.shape[:2]
+        pixels = self.height * self.width
+        self.n_values = {"l1": 3 * pixels, "l2": 3 * pixels, "luma": 256 * pixels,
+                         "ssim": pixels * SSIM_UNIT / 100.0}[kind]
+        self.halo = SSIM_RADIUS if kind == "ssim" else 0
+        self._diff = np.empty_like(self.target)
+        self._weights = np.array(LUMA_WEIGHTS, dtype=np.int32)
+        self._squares = (np.arange(256, dtype=np.int32) ** 2).astype(np.int32)
+        self._diff16 = np.empty(self.target.shape, np.uint16) if kind == "l2" else None
+        if kind == "ssim":
+            t = cv2.cvtColor(self.target, cv2.COLOR_BGR2GRAY).astype(np.float32)
+            self._luma = t
+            self._mu = _box(t)
+            self._var = _box(t * t) - self._mu * self._mu
+
+    def expand(self, roi: Optional[ROI], by: Optional[int] = None) -> Optional[ROI]:
+        """roi grown by `by` (default: the halo) pixels, clipped to the canvas."""
+        if roi is None:
+            return None
+        r = self.halo if by is None else by
+        x0, y0, x1, y1 = roi
+        return max(0, x0 - r), max(0, y0 - r), min(self.width, x1 + r), min(self.height, y1 + r)
+
+    def _pixel_error(self, target: np.ndarray, canvas: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        d = cv2.absdiff(target, canvas, dst=out)
+        if self.kind == "l1":
+            return d.sum(axis=2, dtype=np.int32)
+        if self.kind == "l2":
+            return self._squares[d].sum(axis=2, dtype=np.int32)
+        return np.dot(d, self._weights).astype(np.int32, copy=False)
+
+    def _ssim_error(self, canvas: np.ndarray, ctx: ROI) -> np.ndarray:
+        """Error map of canvas (the pixels of ctx); exact wherever the window stays inside ctx."""
+        x0, y0, x1, y1 = ctx
+        c = cv2.cvtColor(canvas, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        t = self._luma[y0:y1, x0:x1]
+        mu_t = self._mu[y0:y1, x0:x1]
+        mu_c = _box(c)
+        var_c = _box(c * c) - mu_c * mu_c
+        cov = _box(t * c) - mu_t * mu_c
+        ssim = ((2 * mu_t * mu_c + SSIM_C1) * (2 * cov + SSIM_C2)) / \
+               ((mu_t * mu_t + mu_c * mu_c + SSIM_C1) * (self._var[y0:y1, x0:x1] + var_c + SSIM_C2))
+        return np.rint((1.0 - ssim) * SSIM_UNIT).astype(np.int32)
+
+    def error_map(self, canvas: np.ndarray) -> np.ndarray:
+        """int32 per-pixel error of a full canvas."""
+        if self.kind == "ssim":
+            return self._ssim_error(canvas, (0, 0, self.width, self.height))
+        return self._pixel_error(self.target, canvas, self._diff)
+
+    def patch_error(self, canvas: np.ndarray, roi: ROI, patch: np.ndarray) -> Tuple[ROI, np.ndarray]:
+        """(region, error map over region) of canvas with its roi pixels replaced by patch."""
+        x0, y0, x1, y1 = roi
+        if self.kind != "ssim":
+            return roi, self._pixel_error(self.target[y0:y1, x0:x1], patch)
+        ex0, ey0, ex1, ey1 = eroi = self.expand(roi)
+        ctx = cx0, cy0, cx1, cy1 = self.expand(roi, 2 * self.halo)
+        c = canvas[cy0:cy1, cx0:cx1].copy()
+        c[y0 - cy0:y1 - cy0, x0 - cx0:x1 - cx0] = patch
+        return eroi, self._ssim_error(c, ctx)[ey0 - cy0:ey1 - cy0, ex0 - cx0:ex1 - cx0]
+
+    def patch_delta(self, canvas: np.ndarray, err: np.ndarray, roi: ROI, patch: np.ndarray) -> int:
+        """Total error change if roi of canvas (with error map err) became patch."""
+        x0, y0, x1, y1 = roi
+        if self.kind == "l1":
+            new = int(cv2.norm(self.target[y0:y1, x0:x1], patch, cv2.NORM_L1))
+        elif self.kind == "l2":
+            new = self._sum_squares(self.target[y0:y1, x0:x1], patch)
+        else:
+            (x0, y0, x1, y1), new_err = self.patch_error(canvas, roi, patch)
+            new = int(new_err.sum(dtype=np.int64))
+        return new - int(err[y0:y1, x0:x1].sum(dtype=np.int64))
+
+    def _sum_squares(self, target: np.ndarray, canvas: np.ndarray, full: bool = False) -> int:
+        # |diff|^2 fits uint16 and its sum is exact (OpenCV's NORM_L2SQR accumulates in floating point)
+        if full:
+            d = cv2.absdiff(target, canvas, dst=self._diff)
+            d16 = self._diff16
+            np.copyto(d16, d)
+        else:
+            d16 = cv2.absdiff(target, canvas).astype(np.uint16)
+        cv2.multiply(d16, d16, dst=d16)
+        return int(sum(cv2.sumElems(d16)))
+
+    def loss(self, canvas: np.ndarray) -> float:
+        if self.kind == "l1":
+            return cv2.norm(self.target, canvas, cv2.NORM_L1) / self.n_values
+        if self.kind == "l2":
+            return self._sum_squares(self.target, canvas, full=True) / self.n_values
+        if self.kind == "luma":
+            sums = cv2.sumElems(cv2.absdiff(self.target, canvas, dst=self._diff))
+            return int(sum(w * int(v) for w, v in zip(LUMA_WEIGHTS, sums))) / self.n_values
+        return int(self.error_map(canvas).sum(dtype=np.int64)) / self.n_values
+
+
 def error_map_gray(target_bgr: np.ndarray, current_bgr: np.ndarray) -> np.ndarray:
     t = cv2.cvtColor(target_bgr, cv2.COLOR_BGR2GRAY).astype(np.float32)
     c = cv2.cvtColor(current_bgr, cv2.COLOR_BGR2GRAY).astype(np.float32)
     return np.abs(t - c)
+
+
+class FitnessCache:
+    """Bounded LRU map genotype key -> fitness."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(0, int(max_entries))
+        self._data: "OrderedDict[bytes, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Optional[float]:
+        v = self._data.get(key)
+        if v is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return v
+
+    def put(self, key: bytes, fitness: float) -> None:
+        if self.max_entries == 0:
+            return
+        self._data[key] = fitness
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
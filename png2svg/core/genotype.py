@@ -1,16 +1,18 @@
 # genotype.py
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import List, Optional
 from core.shapes import Shape
 
 
 @dataclass
 class Genotype:
     shapes: List[Shape]
+    # fitness it was scored at, if known (the GA's cache key lives on ArrayGenotype)
+    fitness: Optional[float] = field(default=None, compare=False, repr=False)
 
     def copy(self) -> "Genotype":
-        return Genotype([s.copy() for s in self.shapes])
+        return Genotype([s.copy() for s in self.shapes], self.fitness)
 
     def __len__(self) -> int:
         return len(self.shapes)
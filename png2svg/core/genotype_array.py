@@ -0,0 +1,68 @@
+# genotype_array.py
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable, List, Optional, Union
+import numpy as np
+
+from core.codec import SHAPE_DTYPE, decode_shape, decode_shapes, encode_shape, encode_shapes
+from core.genotype import Genotype
+from core.shapes import Shape
+
+
+class ArrayGenotype:
+    """
+    Structure-of-arrays genotype: one SHAPE_DTYPE record per shape.
+    copy() is a single memcpy, slicing returns views, and shapes are only
+    materialised as Shape objects on access (render, export, save).
+    """
+
+    def __init__(self, data: Optional[np.ndarray] = None, fitness: Optional[float] = None):
+        self.data = np.zeros(0, dtype=SHAPE_DTYPE) if data is None else data
+        self.fitness = fitness
+        self._key: Optional[bytes] = None
+
+    @classmethod
+    def from_shapes(cls, shapes: Iterable[Shape]) -> "ArrayGenotype":
+        return cls(encode_shapes(list(shapes)))
+
+    @classmethod
+    def from_genotype(cls, g: Genotype) -> "ArrayGenotype":
+        return cls(encode_shapes(g.shapes), g.fitness)
+
+    def to_genotype(self) -> Genotype:
+        return Genotype(decode_shapes(self.data), self.fitness)
+
+    @property
+    def shapes(self) -> List[Shape]:
+        return decode_shapes(self.data)
+
+    def copy(self) -> "ArrayGenotype":
+        c = ArrayGenotype(self.data.copy(), self.fitness)
+        c._key = self._key
+        return c
+
+    def touch(self) -> None:
+        self.fitness = None
+        self._key = None
+
+    def key(self) -> bytes:
+        if self._key is None:
+            self._key = hashlib.blake2b(self.data.tobytes(), digest_size=16).digest()
+        return self._key
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Shape, "ArrayGenotype"]:
+        if isinstance(idx, slice):
+            return ArrayGenotype(self.data[idx])
+        return decode_shape(self.data[idx].tolist())
+
+    def __setitem__(self, idx: int, s: Shape) -> None:
+        self.data[idx] = encode_shape(s)
+        self.touch()
+
+    def append(self, s: Shape) -> None:
+        self.data = np.append(self.data, np.array([encode_shape(s)], dtype=SHAPE_DTYPE))
+        self.touch()
@@ -1,45 +1,56 @@
 # mutation.py
 from __future__ import annotations
 
-import random
-from typing import Tuple
+from typing import Optional, Tuple
 import numpy as np
 
-from core.shapes import Rectangle, Circle, Ellipse, Shape, clamp_int, sample_rgb_from_target
+from core.color_fit import ColorFitter
+from core.shapes import RGB, Rectangle, Circle, Ellipse, Shape, clamp_int, sample_rgb_from_target
+from core.target_index import TargetIndex
+from utils.rng import RandomStream
 
 
-def _choose_mode(shape_mode: str) -> str:
+def _choose_mode(rng: RandomStream, shape_mode: str) -> str:
     if shape_mode in ("rectangle", "circle", "ellipse"):
         return shape_mode
-    r = random.random()
+    r = rng.random()
     return "rectangle" if r < 0.34 else "circle" if r < 0.67 else "ellipse"
 
 
-def random_shape(width: int, height: int, target_bgr: np.ndarray, shape_mode: str,
-                 min_size: int, max_size: int, alpha_floor: float) -> Shape:
-    mode = _choose_mode(shape_mode)
-    cx = random.randint(0, width - 1)
-    cy = random.randint(0, height - 1)
-    color = sample_rgb_from_target(target_bgr, cx, cy)
-    alpha = random.uniform(alpha_floor, 0.95)
+def _sample_color(target_bgr: np.ndarray, index: Optional[TargetIndex], x: int, y: int, small_scale: int) -> RGB:
+    if index is None:
+        return sample_rgb_from_target(target_bgr, x, y)
+    # mean over the footprint of one fitness pixel, O(1) from the summed-area table
+    return index.mean_rgb(x, y, radius=small_scale // 2)
+
+
+def random_shape(rng: RandomStream, width: int, height: int, target_bgr: np.ndarray, shape_mode: str,
+                 min_size: int, max_size: int, alpha_floor: float,
+                 index: Optional[TargetIndex] = None, small_scale: int = 1) -> Shape:
+    mode = _choose_mode(rng, shape_mode)
+    cx = rng.randint(0, width - 1)
+    cy = rng.randint(0, height - 1)
+    color = _sample_color(target_bgr, index, cx, cy, small_scale)
+    alpha = rng.uniform(alpha_floor, 0.95)
 
     if mode == "rectangle":
-        w = random.randint(min_size, max(min_size + 1, max_size))
-        h = random.randint(min_size, max(min_size + 1, max_size))
-        angle = random.uniform(0.0, 360.0)
+        w = rng.randint(min_size, max(min_size + 1, max_size))
+        h = rng.randint(min_size, max(min_size + 1, max_size))
+        angle = rng.uniform(0.0, 360.0)
         return Rectangle(cx, cy, w, h, color, alpha, angle, _age=0)
 
     if mode == "circle":
-        r = random.randint(min_size, max(min_size + 1, max_size))
+        r = rng.randint(min_size, max(min_size + 1, max_size))
         return Circle(cx, cy, r, color, alpha, _age=0)
 
-    rx = random.randint(min_size, max(min_size + 1, max_size))
-    ry = random.randint(min_size, max(min_size + 1, max_size))
-    angle = random.uniform(0.0, 360.0)
+    rx = rng.randint(min_size, max(min_size + 1, max_size))
+    ry = rng.randint(min_size, max(min_size + 1, max_size))
+    angle = rng.uniform(0.0, 360.0)
     return Ellipse(cx, cy, rx, ry, color, alpha, angle, _age=0)
 
 
 def propose_shape_near(
+        rng: RandomStream,
         width: int,
         height: int,
         target_bgr: np.ndarray,
@@ -49,70 +60,84 @@ def propose_shape_near(
         min_size: int,
         max_size: int,
         alpha_floor: float,
+        fitter: Optional[ColorFitter] = None,
+        index: Optional[TargetIndex] = None,
 ) -> Shape:
     hx_s, hy_s = hotspot_small
     hx = int(hx_s * small_scale)
     hy = int(hy_s * small_scale)
 
     jitter = max(8, 16 * small_scale)
-    cx = clamp_int(hx + random.randint(-jitter, jitter), 0, width - 1)
-    cy = clamp_int(hy + random.randint(-jitter, jitter), 0, height - 1)
+    cx = clamp_int(hx + rng.randint(-jitter, jitter), 0, width - 1)
+    cy = clamp_int(hy + rng.randint(-jitter, jitter), 0, height - 1)
 
-    mode = _choose_mode(shape_mode)
-    color = sample_rgb_from_target(target_bgr, cx, cy)
-    alpha = random.uniform(alpha_floor, 0.95)
+    mode = _choose_mode(rng, shape_mode)
+    color = _sample_color(target_bgr, index, cx, cy, small_scale)
+    alpha = rng.uniform(alpha_floor, 0.95)
 
     if mode == "rectangle":
-        w = random.randint(min_size, max(min_size + 1, max_size))
-        h = random.randint(min_size, max(min_size + 1, max_size))
-        angle = random.uniform(0.0, 360.0)
-        return Rectangle(cx, cy, w, h, color, alpha, angle, _age=0)
-
-    if mode == "circle":
-        r = random.randint(min_size, max(min_size + 1, max_size))
-        return Circle(cx, cy, r, color, alpha, _age=0)
+        w = rng.randint(min_size, max(min_size + 1, max_size))
+        h = rng.randint(min_size, max(min_size + 1, max_size))
+        angle = rng.uniform(0.0, 360.0)
+        s: Shape = Rectangle(cx, cy, w, h, color, alpha, angle, _age=0)
+    elif mode == "circle":
+        r = rng.randint(min_size, max(min_size + 1, max_size))
+        s = Circle(cx, cy, r, color, alpha, _age=0)
+    else:
+        rx = rng.randint(min_size, max(min_size + 1, max_size))
+        ry = rng.randint(min_size, max(min_size + 1, max_size))
+        angle = rng.uniform(0.0, 360.0)
+        s = Ellipse(cx, cy, rx, ry, color, alpha, angle, _age=0)
 
-    rx = random.randint(min_size, max(min_size + 1, max_size))
-    ry = random.randint(min_size, max(min_size + 1, max_size))
-    angle = random.uniform(0.0, 360.0)
-    return Ellipse(cx, cy, rx, ry, color, alpha, angle, _age=0)
+    if fitter is not None:
+        fitter.fit(s, alpha_floor, 0.95)
+    return s
 
 
 def mutate_one_shape_inplace(
+        rng: RandomStream,
         s: Shape,
         width: int,
         height: int,
         target_bgr: np.ndarray,
         small_scale: int,
         alpha_floor: float,
+        fitter: Optional[ColorFitter] = None,
+        index: Optional[TargetIndex] = None,
 ) -> None:
     step = max(2, int(6 * small_scale / 4))
 
     if hasattr(s, "cx"):
-        s.cx = clamp_int(int(s.cx + random.randint(-step, step)), 0, width - 1)
+        s.cx = clamp_int(int(s.cx + rng.randint(-step, step)), 0, width - 1)
     if hasattr(s, "cy"):
-        s.cy = clamp_int(int(s.cy + random.randint(-step, step)), 0, height - 1)
+        s.cy = clamp_int(int(s.cy + rng.randint(-step, step)), 0, height - 1)
 
     if isinstance(s, Rectangle):
-        s.w = clamp_int(int(s.w + random.randint(-10, 10)), 4, max(8, width))
-        s.h = clamp_int(int(s.h + random.randint(-10, 10)), 4, max(8, height))
-        s.angle_deg = (float(s.angle_deg) + random.uniform(-8, 8)) % 360.0
+        s.w = clamp_int(int(s.w + rng.randint(-10, 10)), 4, max(8, width))
+        s.h = clamp_int(int(s.h + rng.randint(-10, 10)), 4, max(8, height))
+        s.angle_deg = (float(s.angle_deg) + rng.uniform(-8, 8)) % 360.0
     elif isinstance(s, Circle):
-        s.radius = clamp_int(int(s.radius + random.randint(-8, 8)), 3, max(6, min(width, height)))
+        s.radius = clamp_int(int(s.radius + rng.randint(-8, 8)), 3, max(6, min(width, height)))
     elif isinstance(s, Ellipse):
-        s.rx = clamp_int(int(s.rx + random.randint(-8, 8)), 3, max(6, width))
-        s.ry = clamp_int(int(s.ry + random.randint(-8, 8)), 3, max(6, height))
-        s.angle_deg = (float(s.angle_deg) + random.uniform(-8, 8)) % 360.0
-
-    if random.random() < 0.45:
-        s.color_rgb = sample_rgb_from_target(target_bgr, int(getattr(s, "cx", 0)), int(getattr(s, "cy", 0)))
+        s.rx = clamp_int(int(s.rx + rng.randint(-8, 8)), 3, max(6, width))
+        s.ry = clamp_int(int(s.ry + rng.randint(-8, 8)), 3, max(6, height))
+        s.angle_deg = (float(s.angle_deg) + rng.uniform(-8, 8)) % 360.0
+
+    if fitter is not None:
+        s.alpha = max(alpha_floor, min(0.98, float(s.alpha + rng.uniform(-0.03, 0.03))))
+        fitter.fit(s, alpha_floor, 0.98)
+        return
+
+    if rng.random() < 0.45:
+        cx, cy = int(getattr(s, "cx", 0)), int(getattr(s, "cy", 0))
+        s.color_rgb = _sample_color(target_bgr, index, cx, cy, small_scale)
     else:
         r, g, b = s.color_rgb
         s.color_rgb = (
-            clamp_int(r + random.randint(-8, 8), 0, 255),
-            clamp_int(g + random.randint(-8, 8), 0, 255),
-            clamp_int(b + random.randint(-8, 8), 0, 255),
+            clamp_int(r + rng.randint(-8, 8), 0, 255),
+            clamp_int(g + rng.randint(-8, 8), 0, 255),
+            clamp_int(b + rng.randint(-8, 8), 0, 255),
         )
 
-    s.alpha = float(s.alpha + random.uniform(-0.03, 0.03))
+    s.alpha = float(s.alpha + rng.uniform(-0.03, 0.03))
     s.alpha = max(alpha_floor, min(0.98, s.alpha))
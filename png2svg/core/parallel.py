@@ -0,0 +1,111 @@
+# parallel.py
+from __future__ import annotations
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional, Sequence, Tuple
+import numpy as np
+
+from core.codec import decode_shapes, encode_shapes
+from core.fitness import FitnessKernel
+from core.incremental import IncrementalCanvas
+from core.phenotype import Phenotype
+from core.shapes import Shape
+
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+
+class SharedArray:
+    """NumPy array backed by multiprocessing.shared_memory, attachable by name from workers."""
+
+    def __init__(self, shape: Tuple[int, ...], dtype, name: Optional[str] = None):
+        dtype = np.dtype(dtype)
+        nbytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def from_array(cls, a: np.ndarray) -> "SharedArray":
+        sa = cls(a.shape, a.dtype)
+        sa.array[...] = a
+        return sa
+
+    @classmethod
+    def attach(cls, spec: ArraySpec) -> "SharedArray":
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    @property
+    def spec(self) -> ArraySpec:
+        return self.shm.name, tuple(self.array.shape), self.array.dtype.str
+
+    def close(self) -> None:
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+_worker: Dict[str, object] = {}
+
+
+def _init_worker(phen_args: tuple, loss: str, target: ArraySpec, canvas: ArraySpec, err: ArraySpec) -> None:
+    arrays = [SharedArray.attach(spec) for spec in (target, canvas, err)]
+    _worker["arrays"] = arrays
+    _worker["state"] = IncrementalCanvas.attach(Phenotype(*phen_args), arrays[0].array, arrays[1].array,
+                                                arrays[2].array, kernel=FitnessKernel(arrays[0].array, loss))
+
+
+def _score_chunk(params: np.ndarray) -> np.ndarray:
+    state: IncrementalCanvas = _worker["state"]  # type: ignore[assignment]
+    return state.delta_batch(decode_shapes(params))
+
+
+class CandidatePool:
+    """
+    Scores candidate shapes in a process pool. Target, canvas and error
+    buffers sit in shared memory (the engine's IncrementalCanvas is rebound
+    onto them), so only encoded shape parameters and integer deltas cross
+    process boundaries. Candidates are generated by the caller and chunks
+    come back in order, so results do not depend on the worker count.
+    """
+
+    def __init__(self, state: IncrementalCanvas, workers: int):
+        self.state = state
+        self.workers = max(1, int(workers))
+        self._target = SharedArray.from_array(state.target)
+        self._canvas = SharedArray.from_array(state.canvas)
+        self._err = SharedArray.from_array(state.err)
+        state.rebind(self._target.array, self._canvas.array, self._err.array)
+
+        phen = state.phen
+        phen_args = (phen.width * phen.scale, phen.height * phen.scale, phen.background_bgr, phen.scale,
+                     phen.renderer, phen.antialias)
+        self.pool = mp.get_context().Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(phen_args, state.kernel.kind, self._target.spec, self._canvas.spec, self._err.spec),
+        )
+
+    def delta_batch(self, shapes: Sequence[Shape]) -> np.ndarray:
+        params = encode_shapes(shapes)
+        chunks = [c for c in np.array_split(params, self.workers) if len(c)]
+        return np.concatenate(self.pool.map(_score_chunk, chunks)) if chunks else np.zeros(0, dtype=np.int64)
+
+    def score_batch(self, shapes: Sequence[Shape]) -> np.ndarray:
+        return (self.state.total + self.delta_batch(shapes)) / self.state.n_values
+
+    def close(self, on_detach: Optional[Callable[[IncrementalCanvas], None]] = None) -> None:
+        """
+        Stop the workers and move the state to private copies. on_detach(state)
+        runs before the shared blocks are unmapped, so other holders of views
+        of them (error index, colour fitter) can switch to the copies.
+        """
+        self.pool.terminate()
+        self.pool.join()
+        self.state.rebind(self.state.target.copy(), self.state.canvas.copy(), self.state.err.copy())
+        if on_detach is not None:
+            on_detach(self.state)
+        for sa in (self._target, self._canvas, self._err):
+            sa.close()
@@ -1,19 +1,95 @@
 # phenotype.py
 from __future__ import annotations
+from typing import Optional, Tuple
+import cv2
 import numpy as np
 from core.genotype import Genotype
+from core.raster import ONE, RENDERERS, NumpyRasterizer
+from core.shapes import Shape, rgb_to_bgr
+
+ROI = Tuple[int, int, int, int]
 
 
 class Phenotype:
-    def __init__(self, width: int, height: int, background_bgr: tuple[int, int, int], scale: int = 1):
+    def __init__(self, width: int, height: int, background_bgr: tuple[int, int, int], scale: int = 1,
+                 renderer: str = "opencv", antialias: bool = False):
         self.scale = max(1, int(scale))
         self.width = max(1, int(width // self.scale))
         self.height = max(1, int(height // self.scale))
         self.background_bgr = tuple(int(c) for c in background_bgr)
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer: {renderer}")
+        self.renderer = renderer
+        self.antialias = bool(antialias)
+        self.raster = NumpyRasterizer(self.scale, antialias) if renderer == "numpy" else None
+
+    def roi(self, s: Shape) -> Optional[ROI]:
+        x0, y0, x1, y1 = s.bbox(self.scale)
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width, x1), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def draw(self, s: Shape, canvas_bgr: np.ndarray, offset: Tuple[int, int] = (0, 0),
+             roi: Optional[ROI] = None) -> None:
+        """
+        Draw s into canvas_bgr, a window of the full canvas starting at offset.
+        OpenCV polygon fills are not translation invariant once clipped, so a
+        shape that sticks out of the window is rasterized over its own clipped
+        bbox first; pixels always match a full-canvas render.
+        """
+        if self.raster is not None:
+            self.raster.draw(s, canvas_bgr, rgb_to_bgr(s.color_rgb), offset)
+            return
+        h, w = canvas_bgr.shape[:2]
+        ox, oy = offset
+        if ox == 0 and oy == 0 and w == self.width and h == self.height:
+            s.draw_on(canvas_bgr, scale=self.scale)
+            return
+        if roi is None:
+            roi = self.roi(s)
+        if roi is None:
+            return
+        x0, y0, x1, y1 = roi
+        if x0 >= ox and y0 >= oy and x1 <= ox + w and y1 <= oy + h:
+            s.draw_on(canvas_bgr, scale=self.scale, offset=offset)
+            return
+
+        ix0, iy0 = max(x0, ox), max(y0, oy)
+        ix1, iy1 = min(x1, ox + w), min(y1, oy + h)
+        if ix0 >= ix1 or iy0 >= iy1:
+            return
+        mask = self.mask(s, roi)
+        m = mask[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0] > 0
+        sub = canvas_bgr[iy0 - oy:iy1 - oy, ix0 - ox:ix1 - ox]
+        overlay = sub.copy()
+        overlay[m] = rgb_to_bgr(s.color_rgb)
+        cv2.addWeighted(overlay, s.alpha, sub, 1.0 - s.alpha, 0.0, sub)
+
+    def mask(self, s: Shape, roi: ROI) -> np.ndarray:
+        """uint8 mask (255 inside) of s over roi, which must contain s's clipped bbox."""
+        if self.raster is not None:
+            return np.where(self.raster.coverage(s, roi) >= ONE // 2, np.uint8(255), np.uint8(0))
+        x0, y0, x1, y1 = roi
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        s.fill(mask, 255, scale=self.scale, offset=(x0, y0))
+        return mask
+
+    def blended(self, s: Shape, base_bgr: np.ndarray, offset: Tuple[int, int]) -> np.ndarray:
+        """Copy of base_bgr (the window of s's clipped bbox at offset) with s composited."""
+        layer = base_bgr.copy()
+        if self.raster is not None:
+            h, w = layer.shape[:2]
+            self.raster.blend(s, layer, (offset[0], offset[1], offset[0] + w, offset[1] + h), rgb_to_bgr(s.color_rgb))
+            return layer
+        s.fill(layer, rgb_to_bgr(s.color_rgb), scale=self.scale, offset=offset)
+        cv2.addWeighted(layer, s.alpha, base_bgr, 1.0 - s.alpha, 0.0, layer)
+        return layer
 
     def render(self, genotype: Genotype) -> np.ndarray:
         canvas = np.empty((self.height, self.width, 3), dtype=np.uint8)
         canvas[:] = self.background_bgr
         for s in genotype.shapes:
-            s.draw_on(canvas, scale=self.scale)
+            self.draw(s, canvas)
         return canvas
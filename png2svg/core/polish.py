@@ -0,0 +1,48 @@
+# polish.py
+from __future__ import annotations
+
+from typing import Optional, Tuple
+import numpy as np
+
+from core.anneal import STEP0, apply_operator, clamp_step, operators_for
+from core.color_fit import ColorFitter
+from core.incremental import IncrementalCanvas
+from core.shapes import Shape
+from core.target_index import TargetIndex
+from utils.rng import RandomStream
+
+
+def polish_shape(
+        rng: RandomStream,
+        state: IncrementalCanvas,
+        s: Shape,
+        score: float,
+        tries: int,
+        width: int,
+        height: int,
+        target_bgr: np.ndarray,
+        small_scale: int,
+        alpha_floor: float,
+        fitter: Optional[ColorFitter] = None,
+        index: Optional[TargetIndex] = None,
+) -> Tuple[Shape, float]:
+    """
+    First-improvement hill climb of one candidate against the frozen canvas
+    (`score` = state.score(s)): `tries` single-operator mutations, each
+    scored over the shape's bbox only. An operator's step grows by 1.5 after
+    an improvement and shrinks by 0.8 otherwise. Returns the best shape and
+    its score; s itself is left untouched.
+    """
+    steps = dict(STEP0)
+    for _ in range(max(0, int(tries))):
+        op = rng.choice(operators_for(s))
+        trial = s.copy()
+        apply_operator(rng, trial, op, steps[op], width, height, target_bgr, small_scale, alpha_floor,
+                       fitter=fitter, index=index)
+        f = state.score(trial)
+        if f < score:
+            s, score = trial, f
+            steps[op] = clamp_step(op, steps[op] * 1.5)
+        else:
+            steps[op] = clamp_step(op, steps[op] * 0.8)
+    return s, score
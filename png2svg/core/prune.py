@@ -0,0 +1,58 @@
+# prune.py
+from __future__ import annotations
+
+from typing import Tuple, Union
+import cv2
+import numpy as np
+
+from core.fitness import FitnessKernel
+from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
+from core.phenotype import Phenotype
+from core.render_cache import RenderCache
+
+_OFF_CANVAS = -(1 << 24)
+
+
+def prune_shapes(
+        genotype: Union[Genotype, ArrayGenotype],
+        target_bgr: np.ndarray,
+        background_bgr: Tuple[int, int, int],
+        threshold: float = 0.0,
+        scale: int = 4,
+        renderer: str = "opencv",
+        antialias: bool = False,
+        loss: str = "l1",
+) -> Genotype:
+    """
+    Drop every shape whose removal raises the loss (at `scale`) by at
+    most `threshold`. Each removal is tried through the refine RenderCache:
+    the shape is moved off-canvas, so only its bbox is re-composited from
+    the nearest layer snapshot. Smallest shapes are tried first; accepted
+    removals are kept, so later tests see the pruned canvas.
+    """
+    g = genotype.to_genotype() if isinstance(genotype, ArrayGenotype) else genotype.copy()
+    if not len(g):
+        return g
+    h, w = target_bgr.shape[:2]
+    phen = Phenotype(w, h, background_bgr, scale=scale, renderer=renderer, antialias=antialias)
+    small = cv2.resize(target_bgr, (phen.width, phen.height), interpolation=cv2.INTER_AREA)
+    cache = RenderCache(phen, small, g, kernel=FitnessKernel(small, loss))
+    current = cache.loss
+
+    removed = set()
+    for idx in sorted(range(len(g)), key=lambda i: g.shapes[i].area()):
+        old = g.shapes[idx]
+        gone = old.copy()
+        gone.cx = gone.cy = _OFF_CANVAS
+        g.shapes[idx] = gone
+        new_loss = cache.replace(g, idx, old)
+        if new_loss - current <= threshold:
+            cache.accept()
+            current = new_loss
+            removed.add(idx)
+        else:
+            g.shapes[idx] = old
+            cache.reject()
+
+    return Genotype([s for i, s in enumerate(g.shapes) if i not in removed], current)
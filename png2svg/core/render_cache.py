@@ -0,0 +1,138 @@
+# render_cache.py
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from core.genotype import Genotype
+from core.fitness import FitnessKernel
+from core.incremental import IncrementalCanvas
+from core.phenotype import Phenotype, ROI
+from core.shapes import Shape
+
+
+def _union(a: Optional[ROI], b: Optional[ROI]) -> Optional[ROI]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _intersects(a: Optional[ROI], b: ROI) -> bool:
+    return a is not None and a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class RenderCache:
+    """
+    Layer checkpoints for the refine phase.
+
+    snapshots[c] holds the canvas after the first c * every shapes. Replacing
+    shape idx re-composites from the nearest checkpoint below idx, and only
+    inside the union of the old and new bounding boxes.
+
+    Protocol: mutate g.shapes[idx], call replace(g, idx, old) to get the new
+    loss, then accept() or restore g.shapes[idx] = old and reject().
+    Any other edit of g must be followed by invalidate(first_changed_idx).
+    """
+
+    def __init__(self, phen: Phenotype, target_small: np.ndarray, genotype: Genotype,
+                 every: int = 8, max_bytes: int = 128 << 20, kernel: Optional[FitnessKernel] = None):
+        self.phen = phen
+        self.top = IncrementalCanvas(phen, target_small, kernel=kernel)
+        self.every_min = max(1, int(every))
+        self.max_bytes = int(max_bytes)
+        self._pending: Optional[Tuple[int, Optional[ROI], ROI, np.ndarray, ROI, np.ndarray, Dict[int, np.ndarray],
+                                      int]] = None
+        self.rebuild(genotype)
+
+    @property
+    def loss(self) -> float:
+        return self.top.loss
+
+    @property
+    def canvas(self) -> np.ndarray:
+        return self.top.canvas
+
+    def rebuild(self, genotype: Genotype, start: int = 0) -> None:
+        n = len(genotype)
+        frame = self.phen.width * self.phen.height * 3
+        max_snaps = max(1, self.max_bytes // frame)
+        every = max(self.every_min, -(-n // max_snaps))
+
+        if start <= 0 or every != getattr(self, "every", None):
+            self.every = every
+            self.snapshots: List[np.ndarray] = [self.phen.render(Genotype([]))]
+            self.rois: List[Optional[ROI]] = []
+            c = 0
+        else:
+            c = min(start // self.every, len(self.snapshots) - 1)
+            del self.snapshots[c + 1:]
+            del self.rois[c * self.every:]
+
+        canvas = self.snapshots[c].copy()
+        for j in range(c * self.every, n):
+            if j > c * self.every and j % self.every == 0:
+                self.snapshots.append(canvas.copy())
+            s = genotype.shapes[j]
+            self.rois.append(self.phen.roi(s))
+            self.phen.draw(s, canvas)
+        self.top.reset(canvas)
+        self._n = n
+        self._pending = None
+
+    def invalidate(self, genotype: Genotype, idx: int = 0) -> None:
+        self.rebuild(genotype, start=idx)
+
+    def under(self, genotype: Genotype, idx: int, roi: ROI) -> np.ndarray:
+        """Composite of shapes [0, idx) inside roi."""
+        x0, y0, x1, y1 = roi
+        c = idx // self.every
+        patch = self.snapshots[c][y0:y1, x0:x1].copy()
+        for j in range(c * self.every, idx):
+            if _intersects(self.rois[j], roi):
+                self.phen.draw(genotype.shapes[j], patch, offset=(x0, y0), roi=self.rois[j])
+        return patch
+
+    def replace(self, genotype: Genotype, idx: int, old: Shape) -> float:
+        if len(genotype) != self._n:
+            self.rebuild(genotype)
+
+        new_roi = self.phen.roi(genotype.shapes[idx])
+        roi = _union(self.rois[idx], new_roi)
+        if roi is None:
+            self._pending = None
+            return self.loss
+
+        x0, y0, x1, y1 = roi
+        c = idx // self.every
+        patch = self.snapshots[c][y0:y1, x0:x1].copy()
+        updates: Dict[int, np.ndarray] = {}
+        for j in range(c * self.every, self._n):
+            if j > idx and j % self.every == 0:
+                updates[j // self.every] = patch.copy()
+            r = new_roi if j == idx else self.rois[j]
+            if _intersects(r, roi):
+                self.phen.draw(genotype.shapes[j], patch, offset=(x0, y0), roi=r)
+
+        eroi, new_err = self.top.kernel.patch_error(self.top.canvas, roi, patch)
+        ex0, ey0, ex1, ey1 = eroi
+        delta = int(new_err.sum(dtype=np.int64)) - int(self.top.err[ey0:ey1, ex0:ex1].sum(dtype=np.int64))
+        total = self.top.total + delta
+        self._pending = (idx, new_roi, roi, patch, eroi, new_err, updates, total)
+        return total / self.top.n_values
+
+    def accept(self) -> None:
+        if self._pending is None:
+            return
+        idx, new_roi, (x0, y0, x1, y1), patch, (ex0, ey0, ex1, ey1), new_err, updates, total = self._pending
+        self.top.canvas[y0:y1, x0:x1] = patch
+        self.top.err[ey0:ey1, ex0:ex1] = new_err
+        self.top.total = total
+        for c, snap in updates.items():
+            self.snapshots[c][y0:y1, x0:x1] = snap
+        self.rois[idx] = new_roi
+        self._pending = None
+
+    def reject(self) -> None:
+        self._pending = None
@@ -0,0 +1,47 @@
+# schedule.py
+from __future__ import annotations
+
+from typing import List, Tuple
+
+
+class ScaleSchedule:
+    """
+    Coarse-to-fine fitness scales: [(scale, until), ...] where `until` is a
+    fraction of the time budget (by="time") or of the shape budget
+    (by="shapes"). The last level runs to the end.
+    """
+
+    def __init__(self, levels: List[Tuple[int, float]], by: str = "time"):
+        if not levels:
+            raise ValueError("Empty scale schedule.")
+        if by not in ("time", "shapes"):
+            raise ValueError(f"Unknown schedule mode: {by}")
+        self.levels = [(max(1, int(s)), float(u)) for s, u in levels]
+        self.levels[-1] = (self.levels[-1][0], float("inf"))
+        self.by = by
+
+    @classmethod
+    def parse(cls, text: str, by: str = "time") -> "ScaleSchedule":
+        """'8:0.25,4:0.6,2' -> scale 8 up to 25%, 4 up to 60%, then 2."""
+        levels = []
+        for item in text.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            scale, _, until = item.partition(":")
+            levels.append((int(scale), float(until) if until else float("inf")))
+        return cls(levels, by)
+
+    @property
+    def first(self) -> int:
+        return self.levels[0][0]
+
+    @property
+    def last(self) -> int:
+        return self.levels[-1][0]
+
+    def scale_at(self, progress: float) -> int:
+        for scale, until in self.levels:
+            if progress < until:
+                return scale
+        return self.last
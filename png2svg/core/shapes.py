@@ -31,6 +31,18 @@ def sample_rgb_from_target(target_bgr: np.ndarray, x: int, y: int) -> RGB:
     return (r, g, b)
 
 
+_SCRATCH = np.empty(0, dtype=np.uint8)
+
+
+def _scratch(shape: Tuple[int, ...]) -> np.ndarray:
+    """Contiguous uint8 buffer of the given shape, reused across draws (grown on demand)."""
+    global _SCRATCH
+    n = int(np.prod(shape))
+    if _SCRATCH.size < n:
+        _SCRATCH = np.empty(max(n, 2 * _SCRATCH.size), dtype=np.uint8)
+    return _SCRATCH[:n].reshape(shape)
+
+
 class Shape(ABC):
     def __init__(self) -> None:
         self.age: int = 0
@@ -44,7 +56,28 @@ class Shape(ABC):
     def alpha(self, v: float) -> None: ...
 
     @abstractmethod
-    def draw_on(self, canvas_bgr: np.ndarray, scale: int = 1) -> None: ...
+    def fill(self, img: np.ndarray, color, scale: int = 1, offset: Tuple[int, int] = (0, 0)) -> None: ...
+
+    def draw_on(self, canvas_bgr: np.ndarray, scale: int = 1, offset: Tuple[int, int] = (0, 0)) -> None:
+        """
+        Fill and alpha-blend the shape over its bbox clipped to canvas_bgr only.
+        The window's edges are either the canvas edges or outside the shape, so
+        the fill clips exactly as it would on the whole canvas.
+        """
+        h, w = canvas_bgr.shape[:2]
+        x0, y0, x1, y1 = self.bbox(scale)
+        x0, y0 = max(0, x0 - offset[0]), max(0, y0 - offset[1])
+        x1, y1 = min(w, x1 - offset[0]), min(h, y1 - offset[1])
+        if x0 >= x1 or y0 >= y1:
+            return
+        sub = canvas_bgr[y0:y1, x0:x1]
+        overlay = _scratch(sub.shape)
+        np.copyto(overlay, sub)
+        self.fill(overlay, rgb_to_bgr(self.color_rgb), scale, (offset[0] + x0, offset[1] + y0))
+        cv2.addWeighted(overlay, self.alpha, sub, 1.0 - self.alpha, 0.0, sub)
+
+    @abstractmethod
+    def bbox(self, scale: int = 1) -> Tuple[int, int, int, int]: ...
 
     @abstractmethod
     def to_svg(self) -> str: ...
@@ -82,17 +115,23 @@ class Rectangle(Shape):
     def area(self) -> float:
         return float(max(0, self.w) * max(0, self.h))
 
-    def draw_on(self, canvas_bgr: np.ndarray, scale: int = 1) -> None:
-        overlay = canvas_bgr.copy()
+    def _box(self, scale: int) -> np.ndarray:
         cx = int(self.cx // scale)
         cy = int(self.cy // scale)
         w = max(1, int(self.w // scale))
         h = max(1, int(self.h // scale))
-
         rect = ((float(cx), float(cy)), (float(w), float(h)), float(self.angle_deg))
-        box = cv2.boxPoints(rect).astype(np.int32)
-        cv2.drawContours(overlay, [box], 0, rgb_to_bgr(self.color_rgb), thickness=-1)
-        cv2.addWeighted(overlay, self.alpha, canvas_bgr, 1.0 - self.alpha, 0.0, canvas_bgr)
+        return cv2.boxPoints(rect).astype(np.int32)
+
+    def bbox(self, scale: int = 1) -> Tuple[int, int, int, int]:
+        box = self._box(scale)
+        x0, y0 = box.min(axis=0)
+        x1, y1 = box.max(axis=0)
+        return int(x0), int(y0), int(x1) + 1, int(y1) + 1
+
+    def fill(self, img: np.ndarray, color, scale: int = 1, offset: Tuple[int, int] = (0, 0)) -> None:
+        box = self._box(scale) - np.array(offset, dtype=np.int32)
+        cv2.drawContours(img, [box], 0, color, thickness=-1)
 
     def to_svg(self) -> str:
         r, g, b = self.color_rgb
@@ -136,13 +175,17 @@ class Circle(Shape):
         r = max(0, self.radius)
         return float(math.pi * r * r)
 
-    def draw_on(self, canvas_bgr: np.ndarray, scale: int = 1) -> None:
-        overlay = canvas_bgr.copy()
+    def bbox(self, scale: int = 1) -> Tuple[int, int, int, int]:
         cx = int(self.cx // scale)
         cy = int(self.cy // scale)
         r = max(1, int(self.radius // scale))
-        cv2.circle(overlay, (cx, cy), r, rgb_to_bgr(self.color_rgb), thickness=-1)
-        cv2.addWeighted(overlay, self.alpha, canvas_bgr, 1.0 - self.alpha, 0.0, canvas_bgr)
+        return cx - r, cy - r, cx + r + 1, cy + r + 1
+
+    def fill(self, img: np.ndarray, color, scale: int = 1, offset: Tuple[int, int] = (0, 0)) -> None:
+        cx = int(self.cx // scale) - offset[0]
+        cy = int(self.cy // scale) - offset[1]
+        r = max(1, int(self.radius // scale))
+        cv2.circle(img, (cx, cy), r, color, thickness=-1)
 
     def to_svg(self) -> str:
         r, g, b = self.color_rgb
@@ -185,23 +228,32 @@ class Ellipse(Shape):
         ry = max(0, self.ry)
         return float(math.pi * rx * ry)
 
-    def draw_on(self, canvas_bgr: np.ndarray, scale: int = 1) -> None:
-        overlay = canvas_bgr.copy()
+    def bbox(self, scale: int = 1) -> Tuple[int, int, int, int]:
         cx = int(self.cx // scale)
         cy = int(self.cy // scale)
         rx = max(1, int(self.rx // scale))
         ry = max(1, int(self.ry // scale))
+        t = math.radians(float(self.angle_deg))
+        hx = math.hypot(rx * math.cos(t), ry * math.sin(t))
+        hy = math.hypot(rx * math.sin(t), ry * math.cos(t))
+        return (int(math.floor(cx - hx)) - 1, int(math.floor(cy - hy)) - 1,
+                int(math.ceil(cx + hx)) + 2, int(math.ceil(cy + hy)) + 2)
+
+    def fill(self, img: np.ndarray, color, scale: int = 1, offset: Tuple[int, int] = (0, 0)) -> None:
+        cx = int(self.cx // scale) - offset[0]
+        cy = int(self.cy // scale) - offset[1]
+        rx = max(1, int(self.rx // scale))
+        ry = max(1, int(self.ry // scale))
         cv2.ellipse(
-            overlay,
+            img,
             (cx, cy),
             (rx, ry),
             float(self.angle_deg),
             0.0,
             360.0,
-            rgb_to_bgr(self.color_rgb),
+            color,
             thickness=-1,
         )
-        cv2.addWeighted(overlay, self.alpha, canvas_bgr, 1.0 - self.alpha, 0.0, canvas_bgr)
 
     def to_svg(self) -> str:
         r, g, b = self.color_rgb
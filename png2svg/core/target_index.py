@@ -0,0 +1,185 @@
+# target_index.py
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from core.shapes import RGB, clamp_int
+
+ROI = Tuple[int, int, int, int]
+
+
+class TileSumTree:
+    """
+    Sum tree over tiles (tile x tile pixel blocks) counting the pixels whose
+    value is >= threshold. Updating the tiles under a ROI and drawing one of
+    those pixels uniformly both cost O(log tiles), plus O(tile^2) inside the
+    tile.
+    """
+
+    def __init__(self, values: np.ndarray, threshold: int = 0, tile: int = 16):
+        self.values = values
+        self.threshold = threshold
+        self.tile = max(1, int(tile))
+        h, w = values.shape
+        self.ty, self.tx = -(-h // self.tile), -(-w // self.tile)
+        self.leaves = 1 << max(0, (self.ty * self.tx - 1).bit_length())
+        self.tree: List[int] = []
+        self.update(None)
+
+    def _tile_sums(self, tx0: int, ty0: int, tx1: int, ty1: int) -> np.ndarray:
+        t = self.tile
+        block = self.values[ty0 * t:ty1 * t, tx0 * t:tx1 * t]
+        ph, pw = (ty1 - ty0) * t - block.shape[0], (tx1 - tx0) * t - block.shape[1]
+        if ph or pw:
+            block = np.pad(block, ((0, ph), (0, pw)))
+        return self._weights(block).reshape(ty1 - ty0, t, tx1 - tx0, t).sum(axis=(1, 3))
+
+    def _weights(self, block: np.ndarray) -> np.ndarray:
+        return (block >= self.threshold).astype(np.int64)
+
+    def update(self, roi: Optional[ROI]) -> None:
+        """Refresh the tiles overlapping roi (None = all) and their ancestors."""
+        t = self.tile
+        if roi is None:
+            tree = np.zeros(2 * self.leaves, dtype=np.int64)
+            tree[self.leaves:self.leaves + self.ty * self.tx] = self._tile_sums(0, 0, self.tx, self.ty).reshape(-1)
+            for i in range(self.leaves - 1, 0, -1):
+                tree[i] = tree[2 * i] + tree[2 * i + 1]
+            self.tree = tree.tolist()  # plain ints: single-node reads/writes are much cheaper than on ndarrays
+            return
+        x0, y0, x1, y1 = roi
+        tx0, ty0 = max(0, x0 // t), max(0, y0 // t)
+        tx1, ty1 = min(self.tx, -(-x1 // t)), min(self.ty, -(-y1 // t))
+        if tx0 >= tx1 or ty0 >= ty1:
+            return
+        tree = self.tree
+        sums = self._tile_sums(tx0, ty0, tx1, ty1).tolist()
+        for r, row in enumerate(sums):
+            base = self.leaves + (ty0 + r) * self.tx + tx0
+            for c, v in enumerate(row):
+                i = base + c
+                tree[i] = v
+                i >>= 1
+                while i:
+                    tree[i] = tree[2 * i] + tree[2 * i + 1]
+                    i >>= 1
+
+    @property
+    def total(self) -> int:
+        return self.tree[1]
+
+    def sample(self, u: float) -> Tuple[int, int]:
+        """Pixel (x, y) drawn uniformly among those >= threshold, u uniform in [0, 1)."""
+        h, w = self.values.shape
+        m = u * self.total
+        if m <= 0:
+            y, x = divmod(min(int(u * w * h), w * h - 1), w)
+            return x, y
+        i = 1
+        while i < self.leaves:
+            left = self.tree[2 * i]
+            if m < left:
+                i = 2 * i
+            else:
+                m -= left
+                i = 2 * i + 1
+        ty, tx = divmod(i - self.leaves, self.tx)
+        t = self.tile
+        block = self.values[ty * t:(ty + 1) * t, tx * t:(tx + 1) * t]
+        cum = self._weights(block).cumsum()
+        k = min(int(np.searchsorted(cum, m, side="right")), cum.size - 1)
+        y, x = divmod(k, block.shape[1])
+        return tx * t + int(x), ty * t + int(y)
+
+
+class TargetIndex:
+    """
+    One scale of the target: a summed-area table of its channels (O(1)
+    region means for colour sampling) and a tile sum tree over the
+    high-error pixels of the current error map for hotspot sampling.
+    """
+
+    def __init__(self, target_bgr: np.ndarray, scale: int = 1):
+        self.target = target_bgr
+        self.scale = int(scale)
+        self.height, self.width = target_bgr.shape[:2]
+        self.sat = cv2.integral(target_bgr, sdepth=cv2.CV_64F)
+        self.error: Optional[np.ndarray] = None
+        self._err_tree: Optional[TileSumTree] = None
+
+    def _clip(self, roi: ROI) -> ROI:
+        x0, y0, x1, y1 = roi
+        return max(0, x0), max(0, y0), min(self.width, x1), min(self.height, y1)
+
+    @staticmethod
+    def _rect(sat: np.ndarray, roi: ROI):
+        x0, y0, x1, y1 = roi
+        return sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+
+    def area(self, roi: ROI) -> int:
+        x0, y0, x1, y1 = self._clip(roi)
+        return max(0, x1 - x0) * max(0, y1 - y0)
+
+    def sum(self, roi: ROI) -> np.ndarray:
+        roi = self._clip(roi)
+        if roi[0] >= roi[2] or roi[1] >= roi[3]:
+            return np.zeros(3)
+        return self._rect(self.sat, roi)
+
+    def mean(self, roi: ROI) -> np.ndarray:
+        n = self.area(roi)
+        return self.sum(roi) / n if n else np.zeros(3)
+
+    def mean_rgb(self, x: int, y: int, radius: int = 0) -> RGB:
+        x = clamp_int(int(x), 0, self.width - 1)
+        y = clamp_int(int(y), 0, self.height - 1)
+        b, g, r = self.mean((x - radius, y - radius, x + radius + 1, y + radius + 1))
+        return int(round(r)), int(round(g)), int(round(b))
+
+    def set_error(self, err: np.ndarray) -> None:
+        self.error = err
+        self._err_tree = None
+
+    def touch_error(self, roi: Optional[ROI] = None) -> None:
+        """The error map changed inside roi (None = anywhere)."""
+        if self._err_tree is not None:
+            self._err_tree.update(roi)
+
+    def sample_error(self, u: float, top: float = 0.10) -> Tuple[int, int]:
+        """
+        Pixel drawn uniformly among the `top` fraction with the highest error,
+        u uniform in [0, 1). The threshold is re-estimated only once the hot
+        set has drifted more than 20% away from its target size.
+        """
+        assert self.error is not None
+        k = max(10, int(top * self.error.size))
+        tree = self._err_tree
+        if tree is None or not 4 * k <= 5 * tree.total <= 6 * k:
+            flat = self.error.reshape(-1)
+            threshold = int(np.partition(flat, flat.size - k)[flat.size - k])
+            tree = self._err_tree = TileSumTree(self.error, threshold)
+        return tree.sample(u)
+
+
+class TargetPyramid:
+    """One TargetIndex per scale, built once and shared by the engines and mutation."""
+
+    def __init__(self, target_bgr: np.ndarray, scales: Iterable[int] = (1,)):
+        self.target = target_bgr
+        self.height, self.width = target_bgr.shape[:2]
+        self.levels: Dict[int, TargetIndex] = {}
+        for s in scales:
+            self.at(s)
+
+    def at(self, scale: int) -> TargetIndex:
+        scale = max(1, int(scale))
+        if scale not in self.levels:
+            if scale == 1:
+                img = self.target
+            else:
+                size = (max(1, self.width // scale), max(1, self.height // scale))
+                img = cv2.resize(self.target, size, interpolation=cv2.INTER_AREA)
+            self.levels[scale] = TargetIndex(img, scale)
+        return self.levels[scale]
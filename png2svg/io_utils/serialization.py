@@ -1,22 +1,224 @@
 # serialization.py
 from __future__ import annotations
 
-import pickle
-from typing import Any
+import json
+import os
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
 
+import numpy as np
+
+from core.codec import KIND_CIRCLE, KIND_ELLIPSE, SHAPE_DTYPE
 from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
+
+FORMAT = "png2svg-checkpoint"
+VERSION = 2  # 2: per-engine PCG64 stream state (version 1 RNG states are ignored)
+MAX_SHAPES = 1 << 22  # refuse absurd files before decoding anything
+MAX_HEADER = 1 << 20  # bytes of JSON header
+_MAX_COORD = 1 << 24  # |cx|, |cy| in pixels: far beyond any canvas, well inside int32 arithmetic
+
+# member -> (dtype, max length); anything else in the archive is never read
+_MEMBERS = {
+    "header": (np.dtype(np.uint8), MAX_HEADER),
+    "shapes": (SHAPE_DTYPE, MAX_SHAPES),
+    "population": (SHAPE_DTYPE, MAX_SHAPES),
+    "population_sizes": (np.dtype("<i8"), MAX_SHAPES),
+}
+
+
+@dataclass
+class Checkpoint:
+    """
+    Engine state on disk: the current genotype (SHAPE_DTYPE records), an
+    optional GA population, progress counters and the engine's RNG stream
+    state (utils.rng.RandomStream.getstate, plain JSON).
+    Stored as an .npz container of plain arrays plus a JSON header, loaded
+    with allow_pickle=False: nothing in the file is ever executed.
+    """
+    shapes: np.ndarray
+    engine: str = ""
+    phase: str = ""
+    best_fitness: float = float("inf")
+    evals: int = 0
+    elapsed: float = 0.0
+    population: Optional[List[np.ndarray]] = None
+    rng: Optional[Dict[str, Any]] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def genotype(self) -> Genotype:
+        return ArrayGenotype(self.shapes.copy(), self.best_fitness).to_genotype()
+
+
+def _rng_state(state: Any) -> Dict[str, Any]:
+    """Validate a RandomStream state read from a header (it is only ever assigned, never executed)."""
+    if not isinstance(state, dict) or state.get("bit_generator") != "PCG64" \
+            or not isinstance(state.get("pos"), int) or not isinstance(state.get("block"), int) \
+            or not 0 <= state["pos"] <= state["block"]:
+        raise ValueError("Invalid checkpoint: bad RNG state.")
+    np.random.PCG64().state = state["state"]  # raises on a malformed generator state
+    return state
+
+
+def save_checkpoint(path: str, ck: Checkpoint) -> None:
+    """Write atomically (temp file + rename), so a kill mid-write keeps the previous checkpoint."""
+    header = {"format": FORMAT, "version": VERSION, "engine": ck.engine, "phase": ck.phase,
+              "best_fitness": ck.best_fitness, "evals": ck.evals, "elapsed": ck.elapsed, "meta": ck.meta}
+    arrays: Dict[str, np.ndarray] = {"shapes": np.ascontiguousarray(ck.shapes, dtype=SHAPE_DTYPE)}
+    if ck.population is not None:
+        arrays["population"] = np.concatenate(ck.population) if ck.population else np.zeros(0, SHAPE_DTYPE)
+        arrays["population_sizes"] = np.array([len(p) for p in ck.population], dtype=np.int64)
+    if ck.rng is not None:
+        header["rng"] = ck.rng
+    arrays["header"] = np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _check_members(path: str) -> None:
+    """
+    Read only the .npy headers of the archive members and refuse wrong
+    dtypes, shapes or sizes before np.load allocates anything for the data.
+    """
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if name not in _MEMBERS:
+                continue
+            with zf.open(info) as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+                elif version == (2, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+                else:
+                    raise ValueError(f"Invalid checkpoint: unsupported .npy version for {name}.")
+            want, max_len = _MEMBERS[name]
+            if dtype != want or len(shape) != 1 or shape[0] > max_len:
+                raise ValueError(f"Invalid checkpoint: bad {name} array.")
+            if shape[0] * dtype.itemsize > info.file_size:
+                raise ValueError(f"Invalid checkpoint: truncated {name} array.")
+
+
+def _records(arr: np.ndarray, what: str) -> np.ndarray:
+    """Decoded records must be drawable: known kind, positive sizes, finite angle, alpha in [0, 1]."""
+    if arr.dtype != SHAPE_DTYPE or arr.ndim != 1 or len(arr) > MAX_SHAPES:
+        raise ValueError(f"Invalid checkpoint: bad {what} array.")
+    kind, alpha = arr["kind"], arr["alpha"]
+    if (kind > KIND_ELLIPSE).any() or not np.isfinite(arr["angle"]).all() \
+            or not np.isfinite(alpha).all() or (alpha < 0.0).any() or (alpha > 1.0).any() \
+            or (arr["a"] <= 0).any() or ((arr["b"] <= 0) & (kind != KIND_CIRCLE)).any() \
+            or (np.abs(arr["cx"]) > _MAX_COORD).any() or (np.abs(arr["cy"]) > _MAX_COORD).any():
+        raise ValueError(f"Invalid checkpoint: corrupt {what} records.")
+    return arr
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    """Load and validate a checkpoint; raises ValueError on anything unexpected."""
+    try:
+        _check_members(path)
+        z = np.load(path, allow_pickle=False)
+        if not isinstance(z, np.lib.npyio.NpzFile):
+            raise ValueError("Not a png2svg checkpoint.")
+        with z:
+            files = set(z.files)
+            if "header" not in files or "shapes" not in files:
+                raise ValueError("Not a png2svg checkpoint.")
+            header = json.loads(z["header"].tobytes().decode("utf-8"))
+            if header.get("format") != FORMAT:
+                raise ValueError("Not a png2svg checkpoint.")
+            if int(header.get("version", 0)) > VERSION:
+                raise ValueError(f"Checkpoint version {header['version']} is newer than supported ({VERSION}).")
+            shapes = _records(z["shapes"], "shapes")
+            population = None
+            if "population" in files:
+                flat = _records(z["population"], "population")
+                sizes = z["population_sizes"]
+                if sizes.dtype.kind != "i" or (sizes < 0).any() or int(sizes.sum()) != len(flat):
+                    raise ValueError("Invalid checkpoint: bad population sizes.")
+                population = np.split(flat, np.cumsum(sizes)[:-1]) if len(sizes) else []
+            rng = None
+            if int(header.get("version", 0)) >= 2 and header.get("rng") is not None:
+                rng = _rng_state(header["rng"])
+    except (OSError, KeyError, TypeError, ValueError, AttributeError, UnicodeDecodeError,
+            MemoryError, zipfile.BadZipFile) as e:
+        raise ValueError(f"Unreadable checkpoint {path}: {e}") from e
+
+    return Checkpoint(
+        shapes=shapes,
+        engine=str(header.get("engine", "")),
+        phase=str(header.get("phase", "")),
+        best_fitness=float(header.get("best_fitness", float("inf"))),
+        evals=int(header.get("evals", 0)),
+        elapsed=float(header.get("elapsed", 0.0)),
+        population=population,
+        rng=rng,
+        meta=dict(header.get("meta") or {}),
+    )
+
+
+class CheckpointWriter:
+    """
+    Background checkpointing: the engine hands over a Checkpoint (cheap,
+    arrays only) when due(); a daemon thread writes the latest one. Older
+    pending checkpoints are dropped, never queued.
+    """
+
+    def __init__(self, path: str, interval: float = 30.0):
+        self.path = path
+        self.interval = max(0.0, float(interval))
+        self.written = 0
+        self._last = time.time()
+        self._pending: Optional[Checkpoint] = None
+        self._cv = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="checkpoint", daemon=True)
+        self._thread.start()
+
+    def due(self) -> bool:
+        return time.time() - self._last >= self.interval
+
+    def submit(self, ck: Checkpoint) -> None:
+        self._last = time.time()
+        with self._cv:
+            self._pending = ck
+            self._cv.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cv:
+                while self._pending is None and not self._closed:
+                    self._cv.wait()
+                ck, self._pending = self._pending, None
+                closed = self._closed
+            if ck is not None:
+                save_checkpoint(self.path, ck)
+                self.written += 1
+            if closed and ck is None:
+                return
+
+    def close(self) -> None:
+        """Write whatever is pending and stop the thread."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._thread.join()
 
 
-def save_solution(path: str, genotype: Genotype) -> None:
+def save_solution(path: str, genotype: Union[Genotype, ArrayGenotype]) -> None:
     """Save genotype for restart / analysis."""
-    with open(path, "wb") as f:
-        pickle.dump(genotype, f, protocol=pickle.HIGHEST_PROTOCOL)
+    if isinstance(genotype, Genotype):
+        genotype = ArrayGenotype.from_genotype(genotype)
+    fitness = genotype.fitness if genotype.fitness is not None else float("inf")
+    save_checkpoint(path, Checkpoint(shapes=genotype.data, best_fitness=fitness))
 
 
 def load_solution(path: str) -> Genotype:
     """Load genotype from file."""
-    with open(path, "rb") as f:
-        obj: Any = pickle.load(f)
-    if not isinstance(obj, Genotype):
-        raise ValueError("Loaded object is not a Genotype.")
-    return obj
+    return load_checkpoint(path).genotype()
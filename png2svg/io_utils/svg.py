@@ -1,17 +1,170 @@
 # svg.py
 from __future__ import annotations
-from typing import Tuple
+import gzip
+from typing import List, Sequence, Tuple, Union
+from core.engine_tiled import Tile
 from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
+from core.shapes import Circle, Ellipse, Rectangle, Shape
 
+# decimals per attribute: geometry is integer or half-pixel, so one decimal is exact;
+# 0.1 degree moves a 500 px corner by < 1 px; 3 decimals keep alpha within 1/255
+COORD_DIGITS = 1
+ANGLE_DIGITS = 1
+OPACITY_DIGITS = 3
 
-def export_svg(path: str, genotype: Genotype, width: int, height: int, background_bgr: Tuple[int, int, int]) -> None:
-    b, g, r = background_bgr
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(
-            f'<svg xmlns="http://www.w3.org/2000/svg" '
-            f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n'
-        )
-        f.write(f'  <rect width="100%" height="100%" fill="rgb({r},{g},{b})"/>\n')
+
+def _num(v: float, digits: int = COORD_DIGITS) -> str:
+    s = f"{float(v):.{digits}f}"
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+
+def _hex(rgb: Tuple[int, int, int]) -> str:
+    r, g, b = (int(c) for c in rgb)
+    if r % 17 == 0 and g % 17 == 0 and b % 17 == 0:
+        return f"#{r // 17:x}{g // 17:x}{b // 17:x}"
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _rotate(angle: float, cx: float, cy: float) -> str:
+    """transform attribute, or "" when the rotation is the identity (both shapes are 180-degree symmetric)."""
+    a = _num(float(angle) % 180.0, ANGLE_DIGITS)
+    if a in ("0", "180"):
+        return ""
+    return f' transform="rotate({a} {_num(cx)} {_num(cy)})"'
+
+
+def shape_svg(s: Shape, fill: bool = True) -> str:
+    """Compact SVG element for s; fill=False leaves the fill to an enclosing group."""
+    attrs = f' fill="{_hex(s.color_rgb)}"' if fill else ""
+    opacity = _num(s.alpha, OPACITY_DIGITS)
+    if opacity != "1":
+        attrs += f' fill-opacity="{opacity}"'
+    if isinstance(s, Rectangle):
+        return (f'<rect x="{_num(s.cx - s.w / 2.0)}" y="{_num(s.cy - s.h / 2.0)}" width="{_num(s.w)}" '
+                f'height="{_num(s.h)}"{attrs}{_rotate(s.angle_deg, s.cx, s.cy)}/>')
+    if isinstance(s, Circle):
+        return f'<circle cx="{_num(s.cx)}" cy="{_num(s.cy)}" r="{_num(s.radius)}"{attrs}/>'
+    if isinstance(s, Ellipse):
+        if s.rx == s.ry:
+            return f'<circle cx="{_num(s.cx)}" cy="{_num(s.cy)}" r="{_num(s.rx)}"{attrs}/>'
+        return (f'<ellipse cx="{_num(s.cx)}" cy="{_num(s.cy)}" rx="{_num(s.rx)}" ry="{_num(s.ry)}"'
+                f'{attrs}{_rotate(s.angle_deg, s.cx, s.cy)}/>')
+    raise TypeError(f"Cannot export shape: {type(s).__name__}")
+
+
+class SvgWriter:
+    """
+    Streaming SVG output: elements are buffered and written in chunks, to a
+    gzip stream when the path ends in .svgz. With group_fill, consecutive
+    shapes sharing a fill colour are wrapped in one <g fill="...">; shapes
+    are never reordered, since draw order is the alpha compositing order.
+    """
+
+    def __init__(self, path: str, width: int, height: int, group_fill: bool = False, chunk: int = 512):
+        self.group_fill = bool(group_fill)
+        self.chunk = max(1, int(chunk))
+        self._f = gzip.open(path, "wt", encoding="utf-8") if path.endswith(".svgz") \
+            else open(path, "w", encoding="utf-8")
+        self._buf: List[str] = []
+        self._run: List[Shape] = []
+        self._put(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                  f'viewBox="0 0 {width} {height}">\n')
+
+    def _put(self, text: str) -> None:
+        self._buf.append(text)
+        if len(self._buf) >= self.chunk:
+            self._f.write("".join(self._buf))
+            self._buf.clear()
+
+    def _end_run(self) -> None:
+        run = self._run
+        if len(run) == 1:
+            self._put(shape_svg(run[0]) + "\n")
+        elif run:
+            self._put(f'<g fill="{_hex(run[0].color_rgb)}">\n')
+            for s in run:
+                self._put(shape_svg(s, fill=False) + "\n")
+            self._put("</g>\n")
+        self._run = []
+
+    def raw(self, text: str) -> None:
+        self._end_run()
+        self._put(text)
+
+    def background(self, background_bgr: Tuple[int, int, int]) -> None:
+        b, g, r = background_bgr
+        self.raw(f'<rect width="100%" height="100%" fill="{_hex((r, g, b))}"/>\n')
+
+    def shape(self, s: Shape) -> None:
+        if not self.group_fill:
+            self._put(shape_svg(s) + "\n")
+            return
+        if self._run and tuple(self._run[0].color_rgb) != tuple(s.color_rgb):
+            self._end_run()
+        self._run.append(s)
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        self.raw("</svg>\n")
+        self._f.write("".join(self._buf))
+        self._buf.clear()
+        self._f.close()
+
+    def __enter__(self) -> "SvgWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def export_svg(path: str, genotype: Union[Genotype, ArrayGenotype], width: int, height: int,
+               background_bgr: Tuple[int, int, int], group_fill: bool = False) -> None:
+    with SvgWriter(path, width, height, group_fill=group_fill) as w:
+        w.background(background_bgr)
         for s in genotype.shapes:
-            f.write("  " + s.to_svg() + "\n")
-        f.write("</svg>\n")
+            w.shape(s)
+
+
+def _ramp_mask(w: SvgWriter, mask_id: str, t: Tile, horizontal: bool) -> None:
+    """Mask = the tile's rectangle, fading in linearly over its left (or top) overlap."""
+    feather = t.feather_x if horizontal else t.feather_y
+    fill = "#fff"
+    if feather > 0:
+        if horizontal:
+            ends = f'x1="{t.x0}" y1="0" x2="{t.x0 + feather}" y2="0"'
+        else:
+            ends = f'x1="0" y1="{t.y0}" x2="0" y2="{t.y0 + feather}"'
+        w.raw(f'<linearGradient id="{mask_id}g" gradientUnits="userSpaceOnUse" {ends}>'
+              f'<stop offset="0" stop-color="#fff" stop-opacity="0"/><stop offset="1" stop-color="#fff"/>'
+              f'</linearGradient>\n')
+        fill = f"url(#{mask_id}g)"
+    box = f'x="{t.x0}" y="{t.y0}" width="{t.width}" height="{t.height}"'
+    w.raw(f'<mask id="{mask_id}" maskUnits="userSpaceOnUse" {box}><rect {box} fill="{fill}"/></mask>\n')
+
+
+def export_tiled_svg(path: str, genotype: Union[Genotype, ArrayGenotype], width: int, height: int,
+                     background_bgr: Tuple[int, int, int], tiles: Sequence[Tile],
+                     spans: List[Tuple[int, int]], group_fill: bool = False) -> None:
+    """
+    Stitched tiles (see core.engine_tiled): tile k's shapes are genotype.shapes[spans[k][0]:spans[k][1]],
+    in global coordinates, drawn in order, each group clipped to its tile and feathered over the overlap
+    with earlier tiles by nested horizontal / vertical ramp masks.
+    """
+    shapes = genotype.shapes
+    with SvgWriter(path, width, height, group_fill=group_fill) as w:
+        w.raw("<defs>\n")
+        for k, t in enumerate(tiles):
+            _ramp_mask(w, f"tx{k}", t, horizontal=True)
+            if t.feather_y > 0:
+                _ramp_mask(w, f"ty{k}", t, horizontal=False)
+        w.raw("</defs>\n")
+        w.background(background_bgr)
+        for k, (t, (begin, end)) in enumerate(zip(tiles, spans)):
+            w.raw(f'<g mask="url(#tx{k})">' + (f'<g mask="url(#ty{k})">' if t.feather_y > 0 else "") + "\n")
+            for s in shapes[begin:end]:
+                w.shape(s)
+            w.raw(("</g>" if t.feather_y > 0 else "") + "</g>\n")
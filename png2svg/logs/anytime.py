@@ -1,15 +1,24 @@
+import sys
+import os
+
 import matplotlib.pyplot as plt
-import csv
 
-t, mse = [], []
-with open("./anytime.csv") as f:
-    r = csv.DictReader(f)
-    for row in r:
-        t.append(float(row["time"]))
-        mse.append(float(row["mse"]))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.telemetry import read_telemetry  # noqa: E402
+
+# python logs/anytime.py [run.csv|run.jsonl ...]   (written by png2svg.py --telemetry)
+paths = sys.argv[1:] or ["./anytime.csv"]
+
+names = set()
+for path in paths:
+    rows = read_telemetry(path)
+    names.update(r["loss_name"] for r in rows)
+    plt.plot([r["time"] for r in rows], [r["loss"] for r in rows], label=os.path.basename(path))
 
-plt.plot(t, mse)
+# one named loss across all files labels the axis; mixed or unknown (older logs) stays neutral
 plt.xlabel("Time (s)")
-plt.ylabel("MSE")
+plt.ylabel(f"{names.pop().upper()} loss" if len(names) == 1 and None not in names else "loss")
 plt.title("Anytime behavior")
+if len(paths) > 1:
+    plt.legend()
 plt.show()
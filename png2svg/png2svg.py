@@ -2,23 +2,32 @@
 from __future__ import annotations
 
 import argparse
+import os
 
 from io_utils.image import load_image_bgr
-from io_utils.svg import export_svg
-from utils.rng import seed_all
-
-from core.engine_ga import GAEngine
-from core.engine_greedy import GreedyEngine
+from io_utils.serialization import load_checkpoint
+from core.fitness import LOSSES
+from utils.batch import BUDGETS, collect_inputs, is_batch_input, make_engine, run_batch, write_svg
+from utils.telemetry import Telemetry
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser("png2svg")
 
-    p.add_argument("--input", required=True, help="Input image path.")
-    p.add_argument("--output", required=True, help="Output SVG path.")
-
-    p.add_argument("--algo", choices=["ga", "greedy"], default="greedy",
-                   help="Algorithm: 'ga' baseline, 'greedy' improved (recommended).")
+    p.add_argument("--input", required=True,
+                   help="Input image path, or a directory / glob pattern (quoted) for batch mode.")
+    p.add_argument("--output", required=True,
+                   help="Output SVG path, gzip-compressed if it ends in .svgz (output directory in batch mode).")
+    p.add_argument("--prune", type=float, default=None,
+                   help="Before export, drop shapes whose removal raises the --loss by at most this much "
+                        "(e.g. 0.005; 0 = only useless shapes). Not applied in tiled mode.")
+    p.add_argument("--group-fill", action="store_true",
+                   help="Wrap consecutive shapes of the same colour in one <g fill> group.")
+    p.add_argument("--svgz", action="store_true", help="Batch: write gzip-compressed .svgz files.")
+
+    p.add_argument("--algo", choices=["ga", "greedy", "anneal"], default="greedy",
+                   help="Algorithm: 'ga' baseline, 'greedy' improved (recommended), "
+                        "'anneal' greedy build + simulated-annealing refine.")
 
     p.add_argument("--shape", default="mixed",
                    choices=["rectangle", "circle", "ellipse", "mixed"],
@@ -29,58 +38,113 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--seed", type=int, default=None, help="Random seed.")
 
     p.add_argument("--no-viz", action="store_true", help="Disable OpenCV visualization.")
+    p.add_argument("--viz-size", type=int, default=0,
+                   help="Render the live view at most PX pixels on the long side (0 = full resolution).")
+    p.add_argument("--telemetry", default=None,
+                   help="Stream the anytime curve (time, phase, loss, evals, evals/s, acceptance) "
+                        "to this CSV or .jsonl file.")
+    p.add_argument("--profile", action="store_true", help="Time each engine phase and print a summary.")
+    p.add_argument("--profile-out", default=None,
+                   help="With --profile: also dump collapsed stacks (flamegraph.pl / speedscope) to this file.")
+    p.add_argument("--checkpoint", default=None,
+                   help="Write a resumable checkpoint (.npz) to this path in the background during the run.")
+    p.add_argument("--checkpoint-every", type=float, default=30.0, help="Seconds between checkpoints.")
+    p.add_argument("--resume", default=None,
+                   help="Continue from a checkpoint: greedy resumes building/refining, the GA seeds its population.")
+    p.add_argument("--tile", type=int, default=0,
+                   help="Tiled mode for large images: optimise overlapping tiles of at most TILE x TILE pixels "
+                        "on --jobs processes and stitch them with feathered seams (0 = off).")
+    p.add_argument("--tile-overlap", type=int, default=32, help="Tiled mode: overlap between tiles, in pixels.")
     p.add_argument("--scale", type=int, default=4,
                    help="Fitness scale factor (4 good quality, 6-8 faster).")
+    p.add_argument("--loss", choices=list(LOSSES), default="l1",
+                   help="Fitness: l1, l2 (squared error), luma (luminance-weighted L1) or ssim "
+                        "(1 - SSIM of the luma at the fitness scale).")
+    p.add_argument("--renderer", choices=["opencv", "numpy"], default="opencv",
+                   help="Rasterizer backend: OpenCV primitives or NumPy coverage masks with fixed-point blending.")
+    p.add_argument("--antialias", action="store_true", help="NumPy renderer: 4x4 supersampled edge coverage.")
+
+    p.add_argument("--scale-schedule", default=None,
+                   help="Greedy: coarse-to-fine fitness scales, e.g. '8:0.25,4:0.6,2' "
+                        "(scale 8 up to 25%% of the budget, then 4 up to 60%%, then 2). Overrides --scale.")
+    p.add_argument("--schedule-by", choices=["time", "shapes"], default="time",
+                   help="Greedy: --scale-schedule fractions are of the time budget or of --n.")
 
     p.add_argument("--candidates", type=int, default=45,
                    help="Greedy: candidates per added shape (25-70).")
+    p.add_argument("--polish", type=int, default=0,
+                   help="Greedy: local mutations hill-climbing the winning candidate against the "
+                        "canvas underneath before it is added (0 = off).")
+    p.add_argument("--polish-top", type=int, default=1,
+                   help="Greedy: with --polish, hill-climb the K best candidates and keep the best.")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Greedy: processes scoring candidate shapes (shared-memory canvases).")
     p.add_argument("--refine", type=float, default=0.60,
                    help="Greedy: fraction of time spent refining (0.4-0.8).")
+    p.add_argument("--cache-every", type=int, default=8,
+                   help="Greedy: refine render cache keeps a canvas snapshot every K layers.")
+    p.add_argument("--cache-mb", type=int, default=128,
+                   help="Greedy: memory cap of the refine render cache (MB).")
+
+    p.add_argument("--color-fit", default="sample", choices=["sample", "l2", "l1", "joint"],
+                   help="Greedy: shape colour from a target pixel (sample) or closed-form optimum "
+                        "under the shape (l2, l1, joint = l2 colour + alpha).")
 
     p.add_argument("--pop", type=int, default=20, help="GA: population size.")
     p.add_argument("--mut", type=float, default=0.25, help="GA: per-child mutation probability.")
+    p.add_argument("--fitness-cache", type=int, default=256,
+                   help="GA: LRU fitness cache size (genotype hash -> L1), 0 disables it.")
+    p.add_argument("--islands", type=int, default=1,
+                   help="GA: number of island populations, one process each (1 = single population).")
+    p.add_argument("--migration-interval", type=float, default=2.0, help="GA islands: seconds between migrations.")
+    p.add_argument("--migrants", type=int, default=2, help="GA islands: elites sent per migration.")
+    p.add_argument("--topology", choices=["ring", "all"], default="ring", help="GA islands: migration topology.")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                   help="Batch: worker processes converting images in parallel (tiled mode: tiles in parallel).")
+    p.add_argument("--budget", choices=list(BUDGETS), default="uniform",
+                   help="Batch: split the --time per image bank uniformly, by image size, or by observed "
+                        "convergence (short probe runs, then more time for the images still improving).")
+    p.add_argument("--deadline", type=float, default=None,
+                   help="Batch: global wall-clock limit in seconds; budgets shrink to fit it.")
+    p.add_argument("--skip-existing", action="store_true", help="Batch: keep SVGs that already exist.")
+    p.add_argument("--report", default=None,
+                   help="Batch: JSON report path (default: <output dir>/batch_report.json).")
+    p.add_argument("--init-candidates", type=int, default=1,
+                   help="GA: batch-scored candidates per shape when building the initial population.")
 
     return p.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    seed_all(args.seed)
+
+    if is_batch_input(args.input):
+        inputs = collect_inputs(args.input)
+        if not inputs:
+            raise FileNotFoundError(f"No input images match: {args.input}")
+        run_batch(vars(args), inputs, args.output, jobs=args.jobs, budget=args.budget, deadline=args.deadline,
+                  skip_existing=args.skip_existing, report_path=args.report)
+        return
 
     target = load_image_bgr(args.input)
+    telemetry = Telemetry(args.telemetry, loss_name=args.loss) if args.telemetry else None
+    resume = load_checkpoint(args.resume) if args.resume else None
+
+    engine = make_engine(vars(args), target, telemetry=telemetry, resume=resume, checkpoint=args.checkpoint)
+
+    try:
+        best = engine.run()
+    finally:
+        if telemetry is not None:
+            telemetry.close()
+
+    if args.profile:
+        print("\n" + engine.profiler.report())
+        if args.profile_out:
+            engine.profiler.dump_collapsed(args.profile_out)
+            print(f"Profile saved to: {args.profile_out}")
 
-    if args.algo == "greedy":
-        engine = GreedyEngine(
-            target_bgr=target,
-            shape_mode=args.shape,
-            n_shapes=int(args.n),
-            time_limit=float(args.time),
-            enable_viz=not args.no_viz,
-            fitness_scale=int(args.scale),
-            candidates_per_shape=int(args.candidates),
-            refine_fraction=float(args.refine),
-        )
-    else:
-        engine = GAEngine(
-            target_bgr=target,
-            shape_mode=args.shape,
-            n_shapes=int(args.n),
-            time_limit=float(args.time),
-            enable_viz=not args.no_viz,
-            fitness_scale=int(args.scale),
-            population_size=int(args.pop),
-            mutation_rate=float(args.mut),
-        )
-
-    best = engine.run()
-
-    export_svg(
-        path=args.output,
-        genotype=best,
-        width=engine.width,
-        height=engine.height,
-        background_bgr=engine.background_bgr,
-    )
+    best = write_svg(args.output, engine, best, vars(args))
 
     print("\nFinished.")
     print(f"Algorithm: {args.algo}")
@@ -0,0 +1,352 @@
+# batch.py
+"""
+Batch conversion: a directory or glob of images, one pool of worker processes.
+
+    python png2svg.py --input photos/ --output svgs/ --jobs 8 --time 30 --budget size --deadline 3600
+
+Each worker imports cv2/numpy once and converts images until the queue is
+empty. Budgets come from a bank of `--time` seconds per image, spent
+uniformly, weighted by image size, or by observed convergence: a short
+probe run per image, then resumed runs (from the probe's checkpoint) for
+the images that were still improving, in proportion to their late gain.
+A global deadline squeezes the budgets of the images not started yet.
+"""
+from __future__ import annotations
+
+import contextlib
+import glob
+import json
+import math
+import os
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from core.engine_ga import GAEngine
+from core.engine_greedy import GreedyEngine
+from core.engine_islands import IslandGAEngine
+from core.engine_tiled import TiledEngine
+from core.prune import prune_shapes
+from core.schedule import ScaleSchedule
+from io_utils.image import load_image_bgr
+from io_utils.serialization import load_checkpoint
+from io_utils.svg import export_svg, export_tiled_svg
+from utils.telemetry import Telemetry, read_telemetry
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+BUDGETS = ("uniform", "size", "convergence")
+PROBE_FRACTION = 0.35  # convergence: share of the bank spent on the probe runs
+MIN_BUDGET = 1.0  # seconds; smaller slices are not worth an engine start
+MAX_SHARE = 4.0  # no image gets more than 4x (or less than 1/4 of) the mean budget
+
+
+def make_engine(opts: Dict[str, Any], target: np.ndarray, **overrides):
+    """
+    Engine for the CLI options `opts` (vars(args)); keyword overrides win
+    (time_limit, telemetry...). With opts["tile"] set and an image larger
+    than a tile, the engine runs tile by tile in a TiledEngine.
+    """
+    common: Dict[str, Any] = dict(
+        shape_mode=opts["shape"],
+        n_shapes=int(opts["n"]),
+        time_limit=float(opts["time"]),
+        enable_viz=not opts["no_viz"],
+        viz_size=int(opts["viz_size"]),
+        fitness_scale=int(opts["scale"]),
+        renderer=opts["renderer"],
+        antialias=opts["antialias"],
+        profile=opts["profile"],
+        checkpoint_every=float(opts["checkpoint_every"]),
+        loss=opts["loss"],
+        seed=opts["seed"],
+    )
+    common.update(overrides)
+    if opts["algo"] in ("greedy", "anneal"):
+        schedule = opts["scale_schedule"]
+        cls: type = GreedyEngine
+        kwargs: Dict[str, Any] = dict(
+            candidates_per_shape=int(opts["candidates"]),
+            refine_fraction=float(opts["refine"]),
+            cache_every=int(opts["cache_every"]),
+            cache_mb=int(opts["cache_mb"]),
+            color_fit=opts["color_fit"],
+            workers=int(opts["workers"]),
+            scale_schedule=ScaleSchedule.parse(schedule, opts["schedule_by"]) if schedule else None,
+            refine_strategy="anneal" if opts["algo"] == "anneal" else "hill",
+            polish=int(opts["polish"]),
+            polish_top=int(opts["polish_top"]),
+        )
+    else:
+        cls = GAEngine
+        kwargs = dict(
+            population_size=int(opts["pop"]),
+            mutation_rate=float(opts["mut"]),
+            init_candidates=int(opts["init_candidates"]),
+            fitness_cache=int(opts["fitness_cache"]),
+        )
+        if int(opts["islands"]) > 1:
+            cls = IslandGAEngine
+            kwargs.update(
+                islands=int(opts["islands"]),
+                migration_interval=float(opts["migration_interval"]),
+                migrants=int(opts["migrants"]),
+                topology=opts["topology"],
+            )
+    kwargs.update(common)
+
+    tile = int(opts.get("tile") or 0)
+    if tile and max(target.shape[:2]) > tile:
+        kwargs.pop("seed", None)
+        return TiledEngine(target, cls, tile_size=tile, overlap=int(opts["tile_overlap"]),
+                           jobs=int(opts["jobs"]), seed=opts["seed"], **kwargs)
+    return cls(target, **kwargs)
+
+
+def write_svg(path: str, engine: Any, best: Any, opts: Dict[str, Any]) -> Any:
+    """
+    Export an engine's result (gzip when path ends in .svgz), after the
+    optional --prune pass; tiled results keep their feathered seams.
+    Returns the exported genotype.
+    """
+    group_fill = bool(opts.get("group_fill"))
+    if isinstance(engine, TiledEngine):
+        export_tiled_svg(path, best, engine.width, engine.height, engine.background_bgr, engine.tiles,
+                         engine.spans, group_fill=group_fill)
+        return best
+    if opts.get("prune") is not None:
+        best = prune_shapes(best, engine.target, engine.background_bgr, threshold=float(opts["prune"]),
+                            scale=int(opts["scale"]), renderer=opts["renderer"], antialias=opts["antialias"],
+                            loss=opts["loss"])
+    export_svg(path=path, genotype=best, width=engine.width, height=engine.height,
+               background_bgr=engine.background_bgr, group_fill=group_fill)
+    return best
+
+
+def is_batch_input(spec: str) -> bool:
+    return os.path.isdir(spec) or glob.has_magic(spec)
+
+
+def collect_inputs(spec: str) -> List[str]:
+    """Image files of a directory (not recursive) or of a glob pattern ('**' recurses), sorted."""
+    if os.path.isdir(spec):
+        paths = [os.path.join(spec, name) for name in os.listdir(spec)]
+    else:
+        paths = glob.glob(spec, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTS))
+
+
+def output_paths(inputs: List[str], out_dir: str, ext: str = ".svg") -> List[str]:
+    """out_dir/<path relative to the inputs' common directory>.svg, so globbed subtrees don't collide."""
+    if not inputs:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in inputs])
+    return [os.path.join(out_dir, os.path.splitext(os.path.relpath(os.path.abspath(p), root))[0] + ext)
+            for p in inputs]
+
+
+def _job_seed(seed: Optional[int], name: str) -> Optional[int]:
+    """Per-image seed that does not depend on the scheduling order."""
+    if seed is None:
+        return None
+    return int(np.random.SeedSequence([int(seed), zlib.crc32(name.encode("utf-8"))]).generate_state(1)[0])
+
+
+def _pixels(path: str) -> int:
+    """Approximate pixel count from a 1/8 decode (JPEG decoders scale for free)."""
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    return 0 if img is None else int(img.shape[0]) * int(img.shape[1]) * 64
+
+
+def _late_gain(rows: List[dict]) -> float:
+    """Relative loss decrease per second over the second half of an anytime curve."""
+    if len(rows) < 2 or rows[-1]["time"] <= 0:
+        return 0.0
+    t_end, l_end = rows[-1]["time"], rows[-1]["loss"]
+    mid = next(r for r in rows if r["time"] >= 0.5 * t_end)
+    dt = t_end - mid["time"]
+    if dt <= 0 or not math.isfinite(mid["loss"]):
+        return 0.0
+    return max(0.0, (mid["loss"] - l_end) / max(l_end, 1e-9) / dt)
+
+
+def _clamp_shares(weights: List[float], mean: float) -> List[float]:
+    total = sum(weights) or 1.0
+    n = len(weights)
+    return [min(MAX_SHARE * mean, max(mean / MAX_SHARE, mean * n * w / total)) for w in weights]
+
+
+def _convert(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker: one image, one engine run, one SVG."""
+    t0 = time.time()
+    res: Dict[str, Any] = {"input": job["input"], "output": job["output"], "budget": round(job["budget"], 3),
+                           "status": "ok"}
+    try:
+        target = load_image_bgr(job["input"])
+        telemetry = Telemetry(job["telemetry"], loss_name=job["opts"].get("loss", "l1")) \
+            if job.get("telemetry") else None
+        resume = load_checkpoint(job["resume"]) if job.get("resume") else None
+        # one process per image: tiles of a large image run one after the other
+        engine = make_engine(dict(job["opts"], seed=job["seed"], jobs=1), target, time_limit=job["budget"],
+                             enable_viz=False, profile=False, telemetry=telemetry, resume=resume,
+                             checkpoint=job.get("checkpoint"))
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                best = engine.run()
+        finally:
+            if telemetry is not None:
+                telemetry.close()
+        os.makedirs(os.path.dirname(os.path.abspath(job["output"])), exist_ok=True)
+        best = write_svg(job["output"], engine, best, job["opts"])
+        res.update(loss=round(float(engine.best_fitness), 4), shapes=len(best),
+                   width=engine.width, height=engine.height)
+        if telemetry is not None:
+            res["gain"] = _late_gain(read_telemetry(job["telemetry"]))
+    except Exception as e:  # one bad image must not take the batch down
+        res.update(status="failed", error=f"{type(e).__name__}: {e}")
+    res["elapsed"] = round(time.time() - t0, 3)
+    return res
+
+
+def _run_jobs(pool: ProcessPoolExecutor, jobs: List[Dict[str, Any]], workers: int, deadline: Optional[float],
+              on_done: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Longest allocation first, at most `workers` jobs in flight, so a job's
+    budget is fixed when it actually starts. Past the deadline, remaining
+    allocations are scaled to the worker-seconds left.
+    """
+    pending = deque(sorted(jobs, key=lambda j: -j["alloc"]))
+    left_alloc = sum(j["alloc"] for j in pending)
+    running: Dict[Any, Dict[str, Any]] = {}
+    while pending or running:
+        while pending and len(running) < workers:
+            job = pending.popleft()
+            budget = job["alloc"]
+            if deadline is not None:
+                now = time.time()
+                remaining = deadline - now
+                busy = sum(max(0.0, j["budget"] - (now - j["started"])) for j in running.values())
+                capacity = workers * remaining - busy
+                budget = min(remaining, budget * min(1.0, capacity / max(left_alloc, 1e-9)))
+            left_alloc -= job["alloc"]
+            if budget < MIN_BUDGET:
+                on_done({"input": job["input"], "output": job["output"], "status": "deadline", "budget": 0.0,
+                         "elapsed": 0.0})
+                continue
+            job["budget"], job["started"] = budget, time.time()
+            running[pool.submit(_convert, job)] = job
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in done:
+            running.pop(fut)
+            on_done(fut.result())
+
+
+def run_batch(
+        opts: Dict[str, Any],
+        inputs: List[str],
+        out_dir: str,
+        jobs: int = 1,
+        budget: str = "uniform",
+        deadline: Optional[float] = None,
+        skip_existing: bool = False,
+        report_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Convert `inputs` into out_dir with a pool of `jobs` processes; returns (and writes) the report."""
+    if budget not in BUDGETS:
+        raise ValueError(f"Unknown budget allocation: {budget}")
+    start = time.time()
+    deadline_at = start + float(deadline) if deadline else None
+    workers = max(1, int(jobs))
+    per_image = float(opts["time"])
+    outputs = output_paths(inputs, out_dir, ".svgz" if opts.get("svgz") else ".svg")
+    results: Dict[str, Dict[str, Any]] = {}
+    todo: List[Dict[str, Any]] = []
+    for path, out in zip(inputs, outputs):
+        if skip_existing and os.path.exists(out):
+            results[path] = {"input": path, "output": out, "status": "skipped", "budget": 0.0, "elapsed": 0.0}
+            continue
+        todo.append({"input": path, "output": out, "opts": opts, "alloc": per_image,
+                     "seed": _job_seed(opts["seed"], os.path.relpath(out, out_dir))})
+
+    progress = [len(inputs) - len(todo), len(inputs)]  # finished runs, runs (skipped ones count as finished)
+    print(f"Batch: {len(inputs)} image(s), {len(todo)} to convert, {workers} worker(s), "
+          f"{per_image:g}s/image ({budget}){f', deadline {deadline:g}s' if deadline else ''}", flush=True)
+
+    def on_done(res: Dict[str, Any]) -> None:
+        prev = results.get(res["input"])
+        if prev is not None and prev["status"] == "ok":
+            # a resumed (second pass) run: its time adds up, a failure keeps the first SVG
+            res["budget"] = round(prev["budget"] + res["budget"], 3)
+            res["elapsed"] = round(prev["elapsed"] + res["elapsed"], 3)
+            res["passes"] = prev.get("passes", 1) + 1
+            if res["status"] != "ok":
+                res = dict(prev, passes=res["passes"], budget=res["budget"], elapsed=res["elapsed"])
+        results[res["input"]] = res
+        progress[0] += 1
+        done, total = progress
+        loss = f" {opts['loss'].upper()}={res['loss']:.2f}" if "loss" in res else ""
+        err = f" {res['error']}" if "error" in res else ""
+        print(f"[{done:{len(str(total))}d}/{total}] {res['status']:8s} {res['elapsed']:7.1f}s{loss} "
+              f"{res['input']}{err}", flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, tempfile.TemporaryDirectory(prefix="png2svg-") as tmp:
+        if budget == "size" and todo:
+            for job, share in zip(todo, _clamp_shares([math.sqrt(_pixels(j["input"])) for j in todo], per_image)):
+                job["alloc"] = share
+        elif budget == "convergence":
+            for k, job in enumerate(todo):
+                job["alloc"] = PROBE_FRACTION * per_image
+                job["checkpoint"] = os.path.join(tmp, f"{k}.npz")
+                job["telemetry"] = os.path.join(tmp, f"{k}.csv")
+
+        _run_jobs(pool, todo, workers, deadline_at, on_done)
+
+        if budget == "convergence":
+            probed = [j for j in todo if results[j["input"]]["status"] == "ok" and os.path.exists(j["checkpoint"])]
+            bank = per_image * len(todo) - sum(results[j["input"]]["elapsed"] for j in todo)
+            gains = [results[j["input"]].get("gain", 0.0) for j in probed]
+            second = []
+            if probed and bank > 0 and sum(gains) > 0:
+                for job, gain in zip(probed, gains):
+                    alloc = min(MAX_SHARE * per_image, bank * gain / sum(gains))
+                    if alloc >= MIN_BUDGET:
+                        second.append(dict(job, alloc=alloc, resume=job["checkpoint"], checkpoint=None,
+                                           telemetry=None))
+            progress[1] += len(second)
+            print(f"Convergence: resuming {len(second)} image(s) with {max(0.0, bank):.0f}s left in the bank",
+                  flush=True)
+            _run_jobs(pool, second, workers, deadline_at, on_done)
+
+    elapsed = time.time() - start
+    images = [results[p] for p in inputs if p in results]
+    counts: Dict[str, int] = {}
+    for r in images:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    losses = [r["loss"] for r in images if r["status"] == "ok" and "loss" in r]
+    report = {
+        "elapsed": round(elapsed, 3),
+        "jobs": workers,
+        "budget": budget,
+        "time_per_image": per_image,
+        "deadline": deadline,
+        "counts": counts,
+        "images_per_min": round(60.0 * counts.get("ok", 0) / max(elapsed, 1e-9), 3),
+        "mean_loss": round(float(np.mean(losses)), 4) if losses else None,
+        "images": images,
+    }
+    report_path = report_path or os.path.join(out_dir, "batch_report.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nBatch finished in {elapsed:.1f}s: " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items()))
+          + (f", mean {opts['loss'].upper()}={report['mean_loss']:.2f}" if losses else ""))
+    print(f"Report saved to: {report_path}")
+    return report
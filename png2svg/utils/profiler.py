@@ -0,0 +1,109 @@
+# profiler.py
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Tuple
+
+
+class _Phase:
+    __slots__ = ("prof", "name", "t0")
+
+    def __init__(self, prof: "Profiler", name: str):
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.prof._stack.append(self.name)
+        self.t0 = time.perf_counter_ns()
+
+    def __exit__(self, *exc) -> None:
+        dt = time.perf_counter_ns() - self.t0
+        stack = self.prof._stack
+        key = tuple(stack)
+        st = self.prof.stats.get(key)
+        if st is None:
+            st = self.prof.stats[key] = [0, 0, 0]  # calls, total ns, ns spent in child phases
+        st[0] += 1
+        st[1] += dt
+        stack.pop()
+        if stack:
+            parent = self.prof.stats.get(tuple(stack))
+            if parent is None:
+                parent = self.prof.stats[tuple(stack)] = [0, 0, 0]
+            parent[2] += dt
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL = _NullPhase()
+
+
+class Profiler:
+    """
+    Nested per-phase wall-clock timers and call counters.
+
+        with prof.phase("build"):
+            with prof.phase("score"):
+                ...
+
+    Disabled, phase() returns a shared no-op context manager. Stats are keyed
+    by the phase stack, so they can be dumped as collapsed stacks
+    ("run;build;score <self us>") for flamegraph.pl / speedscope / inferno.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = bool(enabled)
+        self.stats: Dict[Tuple[str, ...], List[int]] = {}
+        self._stack: List[str] = []
+
+    def phase(self, name: str):
+        return _Phase(self, name) if self.enabled else _NULL
+
+    def merge(self, stats: Dict[Tuple[str, ...], List[int]], prefix: str = "") -> None:
+        """Add stats of another profiler (e.g. from a worker process), optionally under a root phase."""
+        for key, st in stats.items():
+            key = (prefix,) + key if prefix else key
+            mine = self.stats.setdefault(key, [0, 0, 0])
+            for i in range(3):
+                mine[i] += st[i]
+            if prefix and len(key) == 2:
+                root = self.stats.setdefault(key[:1], [0, 0, 0])
+                root[1] += st[1]
+                root[2] += st[1]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stack "a/b/c": calls, total and self seconds, share of the root phases' time."""
+        roots = sum(st[1] for key, st in self.stats.items() if len(key) == 1) or 1
+        return {
+            "/".join(key): {
+                "calls": st[0],
+                "total_s": st[1] / 1e9,
+                "self_s": (st[1] - st[2]) / 1e9,
+                "pct": 100.0 * st[1] / roots,
+            }
+            for key, st in sorted(self.stats.items())
+        }
+
+    def report(self) -> str:
+        lines = [f"{'phase':40s} {'calls':>9s} {'total s':>9s} {'self s':>9s} {'%':>6s}"]
+        for name, st in self.summary().items():
+            depth = name.count("/")
+            label = "  " * depth + name.rsplit("/", 1)[-1]
+            lines.append(f"{label:40s} {st['calls']:9d} {st['total_s']:9.3f} {st['self_s']:9.3f} {st['pct']:6.1f}")
+        return "\n".join(lines)
+
+    def dump_collapsed(self, path: str) -> None:
+        """Brendan Gregg's collapsed-stack format, weights in microseconds of self time."""
+        with open(path, "w", encoding="utf-8") as f:
+            for key, st in sorted(self.stats.items()):
+                us = (st[1] - st[2]) // 1000
+                if us > 0:
+                    f.write(f"{';'.join(key)} {us}\n")
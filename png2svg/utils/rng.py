@@ -1,14 +1,88 @@
 # rng.py
 from __future__ import annotations
 
-import random
+import math
 import numpy as np
-from typing import Optional
+from typing import Any, Dict, List, Sequence, TypeVar, Union
 
+T = TypeVar("T")
+Seed = Union[None, int, np.random.SeedSequence]
 
-def seed_all(value: Optional[int]) -> None:
+BLOCK = 4096
+
+
+def spawn_seeds(seed: Seed, n: int) -> List[np.random.SeedSequence]:
+    """Seeds of n independent child streams: the same children for the same root seed."""
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(n)
+
+
+class RandomStream:
     """
-    Seed Python + NumPy RNG for reproducibility.
+    Per-engine random source: a numpy Generator (PCG64) read through a block
+    of pre-generated uniforms, so a scalar draw is a list lookup rather than
+    a call into the global Python / NumPy RNG. Child streams for islands or
+    tiles come from spawn_seeds() (independent SeedSequence children), so a
+    seed fixes every stream of a run whatever the process count.
+
+    The state is the generator state at the start of the current block plus
+    the position in it: getstate()/setstate() resume bit-exactly.
     """
-    random.seed(value)
-    np.random.seed(value)
+
+    def __init__(self, seed: Seed = None, block: int = BLOCK):
+        self.gen = np.random.Generator(np.random.PCG64(seed))
+        self.block = max(1, int(block))
+        self._refill()
+
+    def _refill(self) -> None:
+        self._block_state = self.gen.bit_generator.state
+        self._buf: List[float] = self.gen.random(self.block).tolist()
+        self._pos = 0
+
+    def random(self) -> float:
+        """Uniform in [0, 1)."""
+        if self._pos >= self.block:
+            self._refill()
+        u = self._buf[self._pos]
+        self._pos += 1
+        return u
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def randint(self, a: int, b: int) -> int:
+        """Integer in [a, b], both ends included."""
+        return a + int(self.random() * (b - a + 1))
+
+    def randrange(self, n: int) -> int:
+        return int(self.random() * n)
+
+    def choice(self, seq: Sequence[T]) -> T:
+        return seq[int(self.random() * len(seq))]
+
+    def gauss(self, mu: float = 0.0, sigma: float = 1.0) -> float:
+        """Box-Muller from two block uniforms."""
+        r = math.sqrt(-2.0 * math.log(1.0 - self.random()))
+        return mu + sigma * r * math.cos(2.0 * math.pi * self.random())
+
+    def sample(self, seq: Sequence[T], k: int) -> List[T]:
+        """k distinct elements (partial Fisher-Yates)."""
+        pool = list(seq)
+        n = len(pool)
+        k = min(k, n)
+        for i in range(k):
+            j = i + int(self.random() * (n - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+    def getstate(self) -> Dict[str, Any]:
+        """JSON-serialisable state (the PCG64 state is plain, if large, integers)."""
+        return {"bit_generator": "PCG64", "state": self._block_state, "pos": self._pos, "block": self.block}
+
+    def setstate(self, state: Dict[str, Any]) -> None:
+        if state.get("bit_generator") != "PCG64":
+            raise ValueError(f"Unsupported RNG state: {state.get('bit_generator')}")
+        self.block = max(1, int(state["block"]))
+        self.gen.bit_generator.state = state["state"]
+        self._refill()
+        self._pos = min(max(0, int(state["pos"])), self.block)
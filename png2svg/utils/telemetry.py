@@ -0,0 +1,95 @@
+# telemetry.py
+from __future__ import annotations
+
+import csv
+import json
+import threading
+from typing import List, Optional, Tuple
+
+FIELDS = ("time", "phase", "loss", "evals", "evals_per_sec", "accept_rate", "loss_name")
+
+
+class Telemetry:
+    """
+    Anytime-curve sink shared by the engines. record() only appends a tuple
+    to an in-memory buffer (rate-limited to one row per `min_interval`
+    seconds unless forced); a daemon thread writes the buffer to disk every
+    `flush_interval` seconds, as CSV or JSON lines (.jsonl / .json). Every
+    row names the loss it reports (`loss_name`, the engine's --loss).
+    """
+
+    def __init__(self, path: str, min_interval: float = 0.05, flush_interval: float = 1.0,
+                 loss_name: str = "l1"):
+        self.path = path
+        self.loss_name = str(loss_name)
+        self.jsonl = path.endswith((".jsonl", ".json"))
+        self.min_interval = float(min_interval)
+        self.flush_interval = float(flush_interval)
+        self.rows = 0
+        self._last = float("-inf")
+        self._buf: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._f = open(path, "w", encoding="utf-8", newline="")
+        self._csv = None if self.jsonl else csv.writer(self._f)
+        if self._csv is not None:
+            self._csv.writerow(FIELDS)
+        self._thread = threading.Thread(target=self._flusher, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def record(self, elapsed: float, phase: str, loss: float, evals: int,
+               accept_rate: Optional[float] = None, force: bool = False) -> None:
+        if not force and elapsed - self._last < self.min_interval:
+            return
+        self._last = elapsed
+        eps = evals / elapsed if elapsed > 0 else 0.0
+        row = (round(elapsed, 4), phase, round(float(loss), 6), int(evals), round(eps, 1),
+               None if accept_rate is None else round(float(accept_rate), 5), self.loss_name)
+        with self._lock:
+            self._buf.append(row)
+
+    def _drain(self) -> None:
+        with self._lock:
+            buf, self._buf = self._buf, []
+        if not buf:
+            return
+        if self._csv is not None:
+            self._csv.writerows(["" if v is None else v for v in row] for row in buf)
+        else:
+            self._f.writelines(json.dumps(dict(zip(FIELDS, row))) + "\n" for row in buf)
+        self._f.flush()
+        self.rows += len(buf)
+
+    def _flusher(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        self._f.close()
+
+    def __enter__(self) -> "Telemetry":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_telemetry(path: str) -> List[dict]:
+    """Rows of a telemetry file (CSV or JSON lines) as dicts with float time/loss and
+    loss_name (None when unknown). Older anytime logs (time_sec,best_fitness or
+    time,mse) are accepted too."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for row in rows:
+        row["time"] = float(row.get("time", row.get("time_sec")))
+        row["loss"] = float(row.get("loss", row.get("best_fitness", row.get("mse"))))
+        row["loss_name"] = row.get("loss_name") or None
+    return rows
@@ -1,22 +1,92 @@
 # visualizer.py
 from __future__ import annotations
+
+import math
+import multiprocessing as mp
+import queue
+from typing import Tuple, Union
 import cv2
 import numpy as np
 
+from core.genotype import Genotype
+from core.genotype_array import ArrayGenotype
+from core.phenotype import Phenotype
 
-class Visualizer:
-    def __init__(self, target_bgr: np.ndarray, window_name: str = "PNG2SVG - Live"):
-        self.target = target_bgr
-        self.h, self.w = target_bgr.shape[:2]
-        self.window_name = window_name
-        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
-
-    def update(self, current_bgr: np.ndarray) -> None:
-        if current_bgr.shape != self.target.shape:
-            current_bgr = cv2.resize(current_bgr, (self.w, self.h), interpolation=cv2.INTER_AREA)
-        display = np.hstack([self.target, current_bgr])
-        cv2.imshow(self.window_name, display)
+
+def _viewer_main(frames, target_bgr: np.ndarray, background_bgr: Tuple[int, int, int], max_size: int,
+                 renderer: str, antialias: bool, window_name: str) -> None:
+    """Viewer process: renders the latest snapshot at display resolution; the search never waits on it."""
+    h, w = target_bgr.shape[:2]
+    scale = max(1, math.ceil(max(h, w) / max_size)) if max_size > 0 else 1
+    phen = Phenotype(w, h, background_bgr, scale=scale, renderer=renderer, antialias=antialias)
+    target = cv2.resize(target_bgr, (phen.width, phen.height), interpolation=cv2.INTER_AREA) \
+        if scale > 1 else target_bgr
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    while True:
+        try:
+            data = frames.get(timeout=0.05)
+        except queue.Empty:
+            cv2.waitKey(1)  # keep the window responsive between frames
+            continue
+        if data is None:
+            break
+        current = phen.render(ArrayGenotype(data).to_genotype())
+        cv2.imshow(window_name, np.hstack([target, current]))
         cv2.waitKey(1)
+    cv2.destroyWindow(window_name)
+
+
+class Visualizer:
+    """
+    Live view in a separate process. update() hands over a compact snapshot
+    (SHAPE_DTYPE records) through a one-slot queue and returns at once: when
+    the viewer is still busy with the previous frame, the stale one is
+    dropped in favour of the new one. The viewer renders the shapes itself,
+    at most max_size pixels on the long side (0 = full resolution).
+    """
+
+    def __init__(self, target_bgr: np.ndarray, background_bgr: Tuple[int, int, int], max_size: int = 0,
+                 renderer: str = "opencv", antialias: bool = False, window_name: str = "PNG2SVG - Live"):
+        ctx = mp.get_context()
+        self._frames = ctx.Queue(maxsize=1)
+        self._proc = ctx.Process(
+            target=_viewer_main,
+            args=(self._frames, target_bgr, tuple(background_bgr), max(0, int(max_size)), renderer,
+                  bool(antialias), window_name),
+            name="visualizer",
+            daemon=True,
+        )
+        self._proc.start()
+        self.dropped = 0
+
+    def update(self, genotype: Union[Genotype, ArrayGenotype]) -> None:
+        if isinstance(genotype, Genotype):
+            data = ArrayGenotype.from_genotype(genotype).data
+        else:
+            data = genotype.data.copy()
+        for _ in range(2):
+            try:
+                self._frames.put_nowait(data)
+                return
+            except queue.Full:
+                pass
+            try:
+                self._frames.get_nowait()  # drop the stale frame, retry once
+            except queue.Empty:
+                pass
+            self.dropped += 1
 
     def close(self) -> None:
-        cv2.destroyWindow(self.window_name)
+        if not self._proc.is_alive():
+            return
+        try:
+            self._frames.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._frames.put(None, timeout=1.0)
+        except queue.Full:
+            pass
+        self._proc.join(timeout=2.0)
+        if self._proc.is_alive():
+            self._proc.terminate()